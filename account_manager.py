@@ -1,36 +1,62 @@
 import asyncio
-import json
 import os
+import time
+from contextlib import asynccontextmanager
 from telethon import TelegramClient
 from telethon.sessions import StringSession
 import random
+from account_store import AccountStore
+from config import (
+    ACCOUNT_CONNECT_CONCURRENCY,
+    ACCOUNT_CONNECT_TIMEOUT,
+    CLIENT_LAZY_CONNECT,
+    CLIENT_IDLE_TIMEOUT,
+    CLIENT_POOL_MAX_CONNECTED,
+    CLIENT_WARMUP_DIALOGS
+)
+
+class AccountUnauthorized(RuntimeError):
+    """The stored session was revoked or logged out"""
 
 class AccountManager:
-    def __init__(self):
+    def __init__(self, names=None, read_only=False):
+        """`names` limits the manager to those accounts; `read_only` opens
+        the store without migrating or writing (shard workers)"""
+        # Legacy storage, only read for the one-time migration
         self.accounts_file = 'accounts.json'
         self.sessions_dir = 'sessions'
-        self.accounts = []
+        
+        self.store = AccountStore(read_only=read_only)
+        self.accounts_by_name = {}
         self.active_accounts = []
+        self.failed_accounts = []
+        
+        # Client pool counters
+        self.connects = 0
+        self.evictions = 0
+        # Connects that went over CLIENT_POOL_MAX_CONNECTED (nothing idle to evict)
+        self.overshoots = 0
         
-        # Create sessions directory if not exists
-        os.makedirs(self.sessions_dir, exist_ok=True)
-        self.load_accounts()
+        self.load_accounts(names)
     
-    def load_accounts(self):
-        """Load accounts from JSON file"""
-        try:
-            with open(self.accounts_file, 'r', encoding='utf-8') as f:
-                self.accounts = json.load(f)
-            print(f"✅ Loaded {len(self.accounts)} accounts from file")
-        except FileNotFoundError:
-            self.accounts = []
-            print("📝 No existing accounts file found. Starting fresh.")
-    
-    def save_accounts(self):
-        """Save accounts to JSON file"""
-        with open(self.accounts_file, 'w', encoding='utf-8') as f:
-            json.dump(self.accounts, f, indent=4, ensure_ascii=False)
-        print(f"💾 Saved {len(self.accounts)} accounts to file")
+    @property
+    def accounts(self):
+        """All accounts in the order they were added"""
+        return list(self.accounts_by_name.values())
+    
+    def load_accounts(self, names=None):
+        """Load accounts (or just `names`) from the database"""
+        if not self.store.read_only:
+            self.store.migrate_from_json(self.accounts_file, self.sessions_dir)
+        self.accounts_by_name = {
+            acc['name']: acc for acc in self.store.all()
+            if names is None or acc['name'] in names
+        }
+        
+        if self.accounts_by_name:
+            print(f"✅ Loaded {len(self.accounts_by_name)} accounts from {self.store.db_file}")
+        else:
+            print("📝 No existing accounts found. Starting fresh.")
     
     async def create_new_account(self):
         """Interactive account creation"""
@@ -45,7 +71,7 @@ class AccountManager:
             return None
         
         # Check if name already exists
-        if any(acc['name'] == name for acc in self.accounts):
+        if name in self.accounts_by_name:
             print("❌ Account with this name already exists!")
             return None
         
@@ -78,11 +104,6 @@ class AccountManager:
             me = await client.get_me()
             session_string = session.save()
             
-            # Save session to file
-            session_filename = f"{self.sessions_dir}/{name}.session"
-            with open(session_filename, 'w', encoding='utf-8') as f:
-                f.write(session_string)
-            
             # Create account object
             account = {
                 'name': name,
@@ -92,19 +113,18 @@ class AccountManager:
                 'user_id': me.id,
                 'username': me.username or '',
                 'first_name': me.first_name or '',
-                'session_file': session_filename,
                 'session_string': session_string,
                 'is_active': True
             }
             
-            # Add to accounts list
-            self.accounts.append(account)
-            self.save_accounts()
+            # Save account and session in one transaction
+            self.store.add(account)
+            self.accounts_by_name[name] = account
             
             print(f"✅ Account '{name}' created successfully!")
             print(f"   👤 User ID: {me.id}")
             print(f"   📞 Phone: {phone}")
-            print(f"   💾 Session: {session_filename}")
+            print(f"   💾 Session saved to {self.store.db_file}")
             
             await client.disconnect()
             return account
@@ -113,98 +133,299 @@ class AccountManager:
             print(f"❌ Failed to create account: {e}")
             return None
     
-    async def initialize_accounts(self):
-        """Initialize all active accounts"""
+    async def initialize_accounts(self, names=None):
+        """Initialize all active accounts (or just `names`) concurrently"""
         self.active_accounts = []
+        self.failed_accounts = []
         
-        for account in self.accounts:
-            if not account.get('is_active', True):
-                continue
-                
+        semaphore = asyncio.Semaphore(ACCOUNT_CONNECT_CONCURRENCY)
+        to_start = [
+            acc for acc in self.accounts
+            if acc.get('is_active', True) and (names is None or acc['name'] in names)
+        ]
+        started = time.perf_counter()
+        
+        results = await asyncio.gather(
+            *(self.initialize_account(account, semaphore) for account in to_start)
+        )
+        
+        # Keep the configured account order
+        for client_data, error in results:
+            if client_data:
+                self.active_accounts.append(client_data)
+            else:
+                self.failed_accounts.append(error)
+        
+        self.report_connect_times(time.perf_counter() - started)
+        return self.active_accounts
+    
+    def make_client_data(self, account, client, user_id, username, connect_time):
+        return {
+            'client': client,
+            'name': account['name'],
+            'user_id': user_id,
+            'phone': account['phone'],
+            'username': username or '',
+            'connect_time': connect_time,
+            # Client pool bookkeeping
+            'account': account,
+            'last_used': time.monotonic(),
+            'leases': 0,
+            'pinned': False,
+            'lock': asyncio.Lock(),
+            # Kept across evictions so its entity cache survives reconnects
+            'session': client.session if client is not None else None,
+            'warmed_up': False
+        }
+    
+    async def initialize_account(self, account, semaphore):
+        """Connect one account, returns (client_data, None) or (None, failure)"""
+        # Known user id - the client pool connects it when it's first needed
+        if CLIENT_LAZY_CONNECT and account.get('user_id'):
+            return self.make_client_data(account, None, account['user_id'], account.get('username'), None), None
+        
+        async with semaphore:
+            started = time.perf_counter()
+            client = None
+            
             try:
-                # Load session from file
-                if os.path.exists(account['session_file']):
-                    with open(account['session_file'], 'r', encoding='utf-8') as f:
-                        session_string = f.read().strip()
-                else:
-                    session_string = account['session_string']
-                
                 # Create client
                 client = TelegramClient(
-                    StringSession(session_string),
+                    StringSession(account['session_string']),
                     account['api_id'],
                     account['api_hash']
                 )
                 
-                await client.start()
-                
                 # Verify connection
-                me = await client.get_me()
+                me = await asyncio.wait_for(self.connect_client(client), ACCOUNT_CONNECT_TIMEOUT)
+                connect_time = time.perf_counter() - started
+                self.connects += 1
                 
-                client_data = {
-                    'client': client,
-                    'name': account['name'],
-                    'user_id': me.id,
-                    'phone': account['phone'],
-                    'username': me.username or '',
-                    'session_file': account['session_file']
-                }
+                # Remembered so the next start can connect this account lazily
+                # (a shard worker reports it and the main process saves it)
+                if account.get('user_id') != me.id and not self.store.read_only:
+                    self.store.update(account['name'], user_id=me.id)
                 
-                self.active_accounts.append(client_data)
-                print(f"✅ {account['name']} initialized successfully")
+                client_data = self.make_client_data(account, client, me.id, me.username, connect_time)
+                
+                print(f"✅ {account['name']} initialized successfully ({connect_time:.1f}s)")
+                return client_data, None
                 
             except Exception as e:
+                connect_time = time.perf_counter() - started
+                if isinstance(e, asyncio.TimeoutError):
+                    e = f"timed out after {ACCOUNT_CONNECT_TIMEOUT}s"
                 print(f"❌ Failed to initialize {account['name']}: {e}")
+                
+                if client is not None:
+                    try:
+                        await client.disconnect()
+                    except Exception:
+                        pass
+                
+                return None, {
+                    'name': account['name'],
+                    'error': str(e),
+                    'connect_time': connect_time
+                }
+    
+    async def connect_client(self, client):
+        await client.start()
+        return await client.get_me()
+    
+    async def reconnect_client(self, client, warm_up=True):
+        """Non-interactive connect for the client pool"""
+        await client.connect()
+        if not await client.is_user_authorized():
+            raise AccountUnauthorized("session is no longer authorized")
+        # A fresh StringSession has no entities - load dialogs so the group
+        # id resolves. The session keeps them, so once per session is enough
+        if warm_up:
+            await client.get_dialogs(limit=CLIENT_WARMUP_DIALOGS)
+    
+    def deactivate(self, client_data):
+        """Take an account whose session was revoked out of rotation"""
+        client_data['is_active'] = False
+        print(f"🚫 {client_data['name']} is no longer authorized - disabled until it logs in again")
+        if not self.store.read_only:
+            self.toggle_account_status(client_data['name'], False)
+    
+    async def get_client(self, client_data):
+        """Connected client for an account, connecting it on demand"""
+        client_data['last_used'] = time.monotonic()
+        client = client_data['client']
+        if client is not None and client.is_connected():
+            return client
         
-        print(f"🎯 Total active accounts: {len(self.active_accounts)}")
-        return self.active_accounts
+        async with client_data['lock']:
+            client = client_data['client']
+            if client is not None and client.is_connected():
+                return client
+            
+            await self.make_room()
+            started = time.perf_counter()
+            
+            if client is None:
+                account = client_data['account']
+                session = client_data['session'] or StringSession(account['session_string'])
+                client = TelegramClient(session, account['api_id'], account['api_hash'])
+                client_data['session'] = session
+            
+            try:
+                await asyncio.wait_for(
+                    self.reconnect_client(client, warm_up=not client_data['warmed_up']),
+                    ACCOUNT_CONNECT_TIMEOUT
+                )
+            except AccountUnauthorized:
+                await client.disconnect()
+                self.deactivate(client_data)
+                raise
+            except Exception:
+                await client.disconnect()
+                raise
+            
+            client_data['warmed_up'] = True
+            client_data['client'] = client
+            client_data['connect_time'] = time.perf_counter() - started
+            client_data['last_used'] = time.monotonic()
+            self.connects += 1
+            print(f"🔗 {client_data['name']} connected ({client_data['connect_time']:.1f}s)")
+            return client
     
-    def delete_account(self, account_name):
-        """Delete an account"""
-        account_to_delete = None
+    @asynccontextmanager
+    async def lease(self, client_data):
+        """Use an account's client; it won't be evicted while leased"""
+        client = await self.get_client(client_data)
+        client_data['leases'] += 1
+        try:
+            yield client
+        finally:
+            client_data['leases'] -= 1
+            client_data['last_used'] = time.monotonic()
+    
+    def pin(self, client_data):
+        """Keep this account connected for the whole run (e.g. the listener)"""
+        client_data['pinned'] = True
+    
+    def is_evictable(self, client_data):
+        return (
+            client_data['client'] is not None
+            and not client_data['pinned']
+            and client_data['leases'] == 0
+        )
+    
+    async def evict(self, client_data):
+        """Disconnect and drop the client so its memory and socket are freed"""
+        client = client_data['client']
+        client_data['client'] = None
+        self.evictions += 1
+        try:
+            await client.disconnect()
+        except Exception as e:
+            print(f"⚠️  Error disconnecting {client_data['name']}: {e}")
+    
+    async def make_room(self):
+        """Evict the least recently used idle client when the pool is full"""
+        connected = [cd for cd in self.active_accounts if cd['client'] is not None]
+        if len(connected) < CLIENT_POOL_MAX_CONNECTED:
+            return
         
-        for account in self.accounts:
-            if account['name'] == account_name:
-                account_to_delete = account
-                break
+        idle = [cd for cd in connected if self.is_evictable(cd)]
+        if idle:
+            await self.evict(min(idle, key=lambda cd: cd['last_used']))
+            return
         
-        if not account_to_delete:
+        # Every connected client is pinned or mid-send - connect anyway
+        self.overshoots += 1
+        print(f"⚠️  Client pool over its limit ({len(connected) + 1}/{CLIENT_POOL_MAX_CONNECTED}), "
+              f"nothing idle to evict")
+    
+    async def evict_idle_clients(self):
+        """Disconnect clients unused for CLIENT_IDLE_TIMEOUT seconds"""
+        cutoff = time.monotonic() - CLIENT_IDLE_TIMEOUT
+        for client_data in self.active_accounts:
+            if self.is_evictable(client_data) and client_data['last_used'] < cutoff:
+                await self.evict(client_data)
+                print(f"💤 {client_data['name']} disconnected (idle)")
+    
+    async def idle_eviction_loop(self):
+        while True:
+            await asyncio.sleep(max(5, CLIENT_IDLE_TIMEOUT / 4))
+            await self.evict_idle_clients()
+    
+    async def wait_listening(self, client_data):
+        """Telethon registers handlers right away - nothing to wait for"""
+    
+    def get_pool_stats(self):
+        return {
+            'accounts': len(self.active_accounts),
+            'connected': sum(1 for cd in self.active_accounts if cd['client'] is not None),
+            'connects': self.connects,
+            'evictions': self.evictions,
+            'overshoots': self.overshoots
+        }
+    
+    def report_connect_times(self, total_time):
+        """Print bring-up summary with the slowest sessions"""
+        print(f"🎯 Total active accounts: {len(self.active_accounts)} ({total_time:.1f}s)")
+        
+        if self.failed_accounts:
+            print(f"⚠️  {len(self.failed_accounts)} account(s) failed:")
+            for failure in self.failed_accounts:
+                print(f"   ❌ {failure['name']}: {failure['error']}")
+        
+        connected = [acc for acc in self.active_accounts if acc['connect_time'] is not None]
+        if len(connected) < len(self.active_accounts):
+            print(f"💤 {len(self.active_accounts) - len(connected)} account(s) will connect on demand")
+        
+        slowest = sorted(connected, key=lambda acc: acc['connect_time'], reverse=True)[:3]
+        if len(connected) > 1:
+            print("🐢 Slowest sessions: " + ", ".join(
+                f"{acc['name']} ({acc['connect_time']:.1f}s)" for acc in slowest
+            ))
+    
+    def delete_account(self, account_name):
+        """Delete an account"""
+        if account_name not in self.accounts_by_name:
             print(f"❌ Account '{account_name}' not found!")
             return False
         
-        # Remove session file
+        self.store.delete(account_name)
+        del self.accounts_by_name[account_name]
+        
+        # Remove leftover session file from before the database
+        session_file = os.path.join(self.sessions_dir, f"{account_name}.session")
         try:
-            if os.path.exists(account_to_delete['session_file']):
-                os.remove(account_to_delete['session_file'])
-                print(f"🗑️  Deleted session file: {account_to_delete['session_file']}")
+            if os.path.exists(session_file):
+                os.remove(session_file)
+                print(f"🗑️  Deleted session file: {session_file}")
         except Exception as e:
             print(f"⚠️  Could not delete session file: {e}")
         
-        # Remove from accounts list
-        self.accounts = [acc for acc in self.accounts if acc['name'] != account_name]
-        self.save_accounts()
-        
         print(f"✅ Account '{account_name}' deleted successfully!")
         return True
     
     def toggle_account_status(self, account_name, status):
         """Enable/disable an account"""
-        for account in self.accounts:
-            if account['name'] == account_name:
-                account['is_active'] = status
-                self.save_accounts()
-                action = "enabled" if status else "disabled"
-                print(f"✅ Account '{account_name}' {action}")
-                return True
+        account = self.accounts_by_name.get(account_name)
+        if not account:
+            print(f"❌ Account '{account_name}' not found!")
+            return False
         
-        print(f"❌ Account '{account_name}' not found!")
-        return False
+        self.store.update(account_name, is_active=status)
+        account['is_active'] = status
+        action = "enabled" if status else "disabled"
+        print(f"✅ Account '{account_name}' {action}")
+        return True
+    
+    def get_account(self, account_name):
+        return self.accounts_by_name.get(account_name)
     
     def get_account_count(self):
-        return len(self.accounts)
+        return len(self.accounts_by_name)
     
     def get_active_account_count(self):
-        return len([acc for acc in self.accounts if acc.get('is_active', True)])
+        return len([acc for acc in self.accounts_by_name.values() if acc.get('is_active', True)])
     
     def list_accounts(self):
         """Display all accounts with details"""
@@ -221,6 +442,8 @@ class AccountManager:
     async def disconnect_all(self):
         """Disconnect all active clients"""
         for client_data in self.active_accounts:
+            if client_data['client'] is None:
+                continue
             try:
                 await client_data['client'].disconnect()
                 print(f"🔌 Disconnected {client_data['name']}")
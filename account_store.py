@@ -0,0 +1,133 @@
+"""
+SQLite store for accounts and their Telegram sessions
+"""
+import json
+import os
+import pathlib
+import sqlite3
+from config import ACCOUNTS_DB_FILE
+
+COLUMNS = (
+    'name', 'api_id', 'api_hash', 'phone', 'user_id',
+    'username', 'first_name', 'session_string', 'is_active'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    name TEXT PRIMARY KEY,
+    api_id INTEGER NOT NULL,
+    api_hash TEXT NOT NULL,
+    phone TEXT NOT NULL DEFAULT '',
+    user_id INTEGER,
+    username TEXT NOT NULL DEFAULT '',
+    first_name TEXT NOT NULL DEFAULT '',
+    session_string TEXT NOT NULL DEFAULT '',
+    is_active INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class AccountStore:
+    def __init__(self, db_file=ACCOUNTS_DB_FILE, read_only=False):
+        self.db_file = db_file
+        self.read_only = read_only
+
+        if read_only:
+            # Shard workers only read sessions, the main process owns writes
+            uri = pathlib.Path(db_file).absolute().as_uri() + "?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True)
+            self.conn.row_factory = sqlite3.Row
+            return
+
+        self.conn = sqlite3.connect(db_file)
+        self.conn.row_factory = sqlite3.Row
+
+        # WAL: readers don't block the writer and a crash can't tear the file
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def row_to_account(self, row):
+        account = dict(row)
+        account['is_active'] = bool(account['is_active'])
+        return account
+
+    def all(self):
+        """All accounts in the order they were added"""
+        rows = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM accounts ORDER BY rowid")
+        return [self.row_to_account(row) for row in rows]
+
+    def get(self, name):
+        row = self.conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM accounts WHERE name = ?", (name,)
+        ).fetchone()
+        return self.row_to_account(row) if row else None
+
+    def add(self, account):
+        values = [account.get(column) for column in COLUMNS]
+        values[COLUMNS.index('is_active')] = int(account.get('is_active', True))
+        with self.conn:
+            self.conn.execute(
+                f"INSERT INTO accounts ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                values
+            )
+
+    def update(self, name, **fields):
+        """Change only the given columns, returns False if name is unknown"""
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown account fields: {', '.join(sorted(unknown))}")
+        if 'is_active' in fields:
+            fields['is_active'] = int(fields['is_active'])
+
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        with self.conn:
+            cursor = self.conn.execute(
+                f"UPDATE accounts SET {assignments} WHERE name = ?",
+                [*fields.values(), name]
+            )
+        return cursor.rowcount > 0
+
+    def delete(self, name):
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM accounts WHERE name = ?", (name,))
+        return cursor.rowcount > 0
+
+    def migrate_from_json(self, accounts_file, sessions_dir):
+        """One-time import of accounts.json and sessions/*.session"""
+        done = self.conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if done or not os.path.exists(accounts_file):
+            return 0
+
+        with open(accounts_file, 'r', encoding='utf-8') as f:
+            accounts = json.load(f)
+
+        with self.conn:
+            for account in accounts:
+                # The session file was the copy used at startup, prefer it
+                session_file = account.get('session_file') or os.path.join(sessions_dir, f"{account['name']}.session")
+                session_string = account.get('session_string', '')
+                if os.path.exists(session_file):
+                    with open(session_file, 'r', encoding='utf-8') as sf:
+                        session_string = sf.read().strip() or session_string
+
+                values = [account.get(column) for column in COLUMNS]
+                values[COLUMNS.index('session_string')] = session_string
+                values[COLUMNS.index('is_active')] = int(account.get('is_active', True))
+                values[COLUMNS.index('username')] = account.get('username') or ''
+                values[COLUMNS.index('first_name')] = account.get('first_name') or ''
+                self.conn.execute(
+                    f"INSERT OR IGNORE INTO accounts ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                    values
+                )
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', '1')")
+
+        os.replace(accounts_file, accounts_file + '.migrated')
+        print(f"📦 Migrated {len(accounts)} accounts from {accounts_file} to {self.db_file}")
+        return len(accounts)
+
+    def close(self):
+        self.conn.close()
@@ -4,7 +4,13 @@ Character-Based Bot Controller with Natural Starters
 import asyncio
 import random
 from telethon import events
-from config import GROUP_ID
+from config import GROUP_IDS, STATS_REPORT_INTERVAL, CLIENT_IDLE_TIMEOUT
+from group_state import GroupState
+from message_router import MessageRouter
+from reply_scheduler import ReplyScheduler
+from reply_pipeline import ReplyPipeline
+from lanes import HUMAN, BOT
+from send_queue import SendManager
 
 class BotController:
     def __init__(self, account_manager, personality_manager, message_handler, chat_logger):
@@ -13,7 +19,13 @@ class BotController:
         self.message_handler = message_handler
         self.chat_logger = chat_logger
         self.is_running = False
-        self.processed_messages = {}
+        self.groups = {}  # chat id -> GroupState
+        self.router = MessageRouter()
+        self.scheduler = ReplyScheduler()
+        self.reply_pipeline = ReplyPipeline(self.process_reply_job, on_drop=self.release_reply_job)
+        self.stats_task = None
+        self.eviction_task = None
+        self.sender = SendManager(account_manager.lease)
         
         # Character-specific conversation starters
         self.character_starters = {
@@ -58,7 +70,7 @@ class BotController:
     async def start_simulation(self):
         """Start character-based simulation"""
         self.is_running = True
-        self.processed_messages = {}
+        self.groups = {}
         
         print("🚀 Starting character-based simulation...")
         
@@ -69,108 +81,221 @@ class BotController:
             print("❌ No active clients!")
             return
         
-        # Assign characters
+        # Assign characters - the first group keeps the configured order,
+        # the others rotate it so every group gets its own cast
         active_names = [acc['name'] for acc in self.account_manager.accounts if acc.get('is_active', True)]
         self.personality_manager.assign_personalities(active_names)
         
+        for index, group_id in enumerate(GROUP_IDS):
+            offset = index % len(active_names)
+            assignments = self.personality_manager.make_assignments(active_names[offset:] + active_names[:offset])
+            self.groups[group_id] = GroupState(group_id, assignments)
+        
         # Show character assignments
-        self.personality_manager.show_personality_assignment()
+        if len(self.groups) == 1:
+            self.personality_manager.show_personality_assignment()
+        else:
+            for group in self.groups.values():
+                self.personality_manager.show_personality_assignment(
+                    group.assigned_personalities,
+                    f"CHARACTER ASSIGNMENTS - GROUP {group.group_id}"
+                )
+        
+        # Replies go through a bounded worker pool
+        self.reply_pipeline.start()
+        self.stats_task = asyncio.create_task(self.stats_loop())
         
-        # Setup handlers
-        for client_data in clients:
-            self.setup_handlers(client_data)
+        # One listener receives each group message once
+        self.router.set_accounts(clients)
+        for group in self.groups.values():
+            group.characters_by_user_id = self.personality_manager.build_user_index(
+                clients, group.assigned_personalities
+            )
+        listener = await self.connect_listener()
+        if not listener:
+            print("❌ No account could connect to listen!")
+            return
+        self.setup_handlers(listener)
+        try:
+            await self.account_manager.wait_listening(listener)
+        except Exception as e:
+            print(f"❌ {listener['name']} could not start listening: {e}")
+            return
+        print(f"👂 Listening via {listener['name']} ({len(self.groups)} groups)")
+        
+        # Other accounts connect when they speak and drop when idle
+        if CLIENT_IDLE_TIMEOUT:
+            self.eviction_task = asyncio.create_task(self.account_manager.idle_eviction_loop())
         
         # Start conversation
         await asyncio.sleep(3)
-        await self.initiate_character_conversation()
+        for group in self.groups.values():
+            await self.initiate_character_conversation(group)
         
         print("✅ Character simulation started!")
         print("💬 Natural group dynamics active...")
     
+    async def connect_listener(self):
+        """Elect a listener and keep it connected, failing over on errors"""
+        failed = []
+        while True:
+            listener = self.router.elect_listener(exclude=failed)
+            if not listener:
+                return None
+            try:
+                await self.account_manager.get_client(listener)
+            except Exception as e:
+                print(f"⚠️  Listener {listener['name']} failed to connect: {e}")
+                failed.append(listener)
+                continue
+            self.account_manager.pin(listener)
+            return listener
+    
     def setup_handlers(self, client_data):
-        """Setup message handlers"""
+        """Setup the single inbound handler on the listener account"""
         
-        @client_data['client'].on(events.NewMessage(chats=GROUP_ID))
+        @client_data['client'].on(events.NewMessage(chats=list(self.groups)))
         async def message_handler(event):
-            if not self.is_running:
-                return
-            
-            if event.sender_id == client_data['user_id']:
-                return
-            
-            message_text = event.message.text
-            message_id = event.message.id
-            
-            if not message_text or len(message_text.strip()) < 2:
-                return
-            
-            # Duplicate prevention
-            response_key = f"{client_data['name']}_{message_id}"
-            if response_key in self.processed_messages:
-                return
-            
-            self.processed_messages[response_key] = True
-            
-            # Clean old entries
-            if len(self.processed_messages) > 50:
-                keys = list(self.processed_messages.keys())
-                for old_key in keys[:20]:
-                    del self.processed_messages[old_key]
-            
-            # Get character info
-            character_key = self.personality_manager.assigned_personalities.get(client_data['name'], "curious_teen")
-            character = self.personality_manager.get_character_info(character_key)
-            
-            print(f"\n📨 {client_data['name']} ({character['name']}) received: '{message_text}'")
-            
-            # Typing delay
-            delay = await self.message_handler.get_delay_time()
-            print(f"⌨️ Typing... ({delay:.1f}s)")
-            await asyncio.sleep(delay)
-            
-            # Generate response
-            response = await self.message_handler.generate_response(
+            await self.dispatch_message(event)
+    
+    async def dispatch_message(self, event):
+        """Decode a group message once and hand it to the responding accounts"""
+        if not self.is_running:
+            return
+        
+        group = self.groups.get(event.chat_id)
+        if group is None:
+            return
+        
+        message_text = event.message.text
+        message_id = event.message.id
+        
+        if not message_text or len(message_text.strip()) < 2:
+            return
+        
+        # Duplicate prevention
+        if group.is_duplicate(message_id):
+            return
+        
+        # What was said before this message, shared by every responder.
+        # Our own messages come back through here too, so this is the one
+        # place history is recorded, in the order the group saw it
+        context = group.get_context()
+        sender = self.router.get_account(event.sender_id)
+        group.update_history(message_text, sender['name'] if sender else f"User_{event.sender_id}")
+        self.message_handler.remember_message(group.group_id, message_text)
+        
+        # Real group members go first when the LLM is busy, and bot-to-bot
+        # chatter only gets its own share of the group's reply budget
+        lane = BOT if sender else HUMAN
+        
+        sender_character = self.get_sender_character(group, event.sender_id, message_text)
+        responders, reservation = self.scheduler.pick_responders(
+            group,
+            sender_character,
+            # Accounts sitting out a FloodWait aren't asked
+            [acc for acc in self.router.route(event.sender_id) if not self.sender.is_paused(acc['name'])],
+            lane
+        )
+        
+        for client_data in responders:
+            self.reply_pipeline.submit((group, client_data, message_text, sender_character, context, reservation), lane)
+    
+    async def process_reply_job(self, job):
+        group, client_data, message_text, sender_character, context, reservation = job
+        queued = False
+        try:
+            queued = await self.reply_to_message(group, client_data, message_text, sender_character, context, reservation)
+        finally:
+            # No reply came out of it, the budget slot goes back to the group
+            if not queued:
+                self.scheduler.release(group, reservation)
+    
+    def release_reply_job(self, job):
+        """A queued reply was shed or went stale"""
+        group, reservation = job[0], job[5]
+        self.scheduler.release(group, reservation)
+    
+    def get_sender_character(self, group, sender_id, message_text):
+        """Our own accounts have a known character, others are guessed from text"""
+        character_key = group.characters_by_user_id.get(sender_id)
+        if character_key:
+            return character_key
+        return self.message_handler.detect_sender_character(message_text)
+    
+    async def reply_to_message(self, group, client_data, message_text, sender_character, context="", reservation=None):
+        """Generate one account's reply and queue it, True if a reply was queued"""
+        if not self.is_running:
+            return False
+        
+        # Get character info
+        character_key = group.get_character_key(client_data['name'])
+        character = self.personality_manager.get_character_info(character_key)
+        
+        print(f"\n📨 {client_data['name']} ({character['name']}) received: '{message_text}'")
+        
+        # Typing delay counts down while the response is generated,
+        # the reply goes out when both are done
+        delay = await self.message_handler.get_delay_time()
+        print(f"⌨️ Typing... ({delay:.1f}s)")
+        
+        response, _ = await asyncio.gather(
+            self.message_handler.generate_response(
                 client_data['name'],
-                "",
-                original_message=message_text
-            )
-            
-            if response and len(response.strip()) > 2:
-                try:
-                    await client_data['client'].send_message(GROUP_ID, response)
-                    print(f"✅ {client_data['name']} ({character['name']}) replied: '{response}'")
-                    
-                    # Update history
-                    self.message_handler.update_conversation_history(
-                        message_text,
-                        f"User_{event.sender_id}",
-                        message_id
-                    )
-                    self.message_handler.update_conversation_history(
-                        response,
-                        client_data['name'],
-                        None
-                    )
-                    
-                    # Log
-                    self.chat_logger.log_message(
-                        client_data['name'],
-                        response,
-                        character['name']
-                    )
-                    
-                except Exception as e:
-                    print(f"❌ Error: {e}")
-            else:
-                print(f"⚠️ Empty response")
+                context,
+                original_message=message_text,
+                sender_character=sender_character,
+                group_id=group.group_id,
+                character_key=character_key
+            ),
+            asyncio.sleep(delay)
+        )
+        
+        if response and len(response.strip()) > 2:
+            # The worker moves on, a paused account's outbox must not hold it
+            self.queue_message(group, client_data, response, character, reservation)
+            return True
+        
+        print(f"⚠️ Empty response")
+        return False
+    
+    def queue_message(self, group, client_data, text, character, reservation, action="replied"):
+        """Hand a message to the account's outbox, it is recorded once actually sent.
+        
+        `reservation` is the reply budget slot from pick_responders (None for
+        messages that weren't charged), given back if the send fails.
+        """
+        future = self.sender.submit(client_data, group.group_id, text)
+        future.add_done_callback(
+            lambda sent: self.on_message_sent(sent, group, client_data, text, character, reservation, action)
+        )
     
-    async def initiate_character_conversation(self):
+    def on_message_sent(self, future, group, client_data, text, character, reservation, action):
+        if future.cancelled() or future.exception():
+            if not future.cancelled():
+                print(f"❌ {client_data['name']} could not send '{text}': {future.exception()}")
+            if reservation is not None:
+                self.scheduler.release(group, reservation)
+            return
+        
+        print(f"✅ {client_data['name']} ({character['name']}) {action}: '{text}'")
+        self.scheduler.record_turn(group, client_data['name'])
+        
+        # Log
+        self.chat_logger.log_message(
+            client_data['name'],
+            text,
+            character['name'],
+            group.group_id
+        )
+    
+    async def initiate_character_conversation(self, group):
         """Start conversation with character-appropriate message"""
         if not self.account_manager.active_accounts:
             return
         
         # Choose starter based on priority
-        assignments = self.personality_manager.assigned_personalities
+        assignments = group.assigned_personalities
         
         # Priority: Flirty Boy > Curious Teen > Hustler 1 > Others
         priority_order = ["flirty_boy", "curious_teen", "hustler_1", "mature_guy", "girl", "hustler_2"]
@@ -199,32 +324,58 @@ class BotController:
         starters = self.character_starters.get(starter_character, ["hey everyone"])
         starter_message = random.choice(starters)
         
-        try:
-            await starter_account['client'].send_message(GROUP_ID, starter_message)
-            
-            character = self.personality_manager.get_character_info(starter_character)
-            print(f"\n🎬 {starter_account['name']} ({character['name']}) started: '{starter_message}'")
-            
-            # Track
-            self.message_handler.update_conversation_history(
-                starter_message,
-                starter_account['name'],
-                None
-            )
-            
-            # Log
-            self.chat_logger.log_message(
-                starter_account['name'],
-                starter_message,
-                character['name']
-            )
-            
-        except Exception as e:
-            print(f"❌ Error starting: {e}")
+        character = self.personality_manager.get_character_info(starter_character)
+        print(f"\n🎬 {starter_account['name']} ({character['name']}) starting: '{starter_message}'")
+        # Starters aren't replies, so they don't use the reply budget
+        self.queue_message(group, starter_account, starter_message, character, None, action="started")
+    
+    async def stats_loop(self):
+        """Print load numbers every STATS_REPORT_INTERVAL seconds"""
+        while self.is_running:
+            await asyncio.sleep(STATS_REPORT_INTERVAL)
+            self.report_stats()
+    
+    def report_stats(self):
+        pipeline = self.reply_pipeline.get_stats()
+        print(f"\n📊 Reply queue: depth {pipeline['depth']} (max {pipeline['max_depth']}), "
+              f"{pipeline['processed']} sent, {pipeline['dropped_stale']} stale, "
+              f"{pipeline['dropped_overflow']} shed | "
+              f"human {pipeline['human_processed']}/{pipeline['human_submitted']}, "
+              f"bot {pipeline['bot_processed']}/{pipeline['bot_submitted']} "
+              f"({pipeline['bot_busy']}/{self.reply_pipeline.lane_limits[BOT]} bot workers busy)")
+        
+        sends = self.sender.get_stats()
+        print(f"📤 Sends: {sends['sent']} sent, {sends['queued']} queued, {sends['retries']} retries, "
+              f"{sends['failed']} failed, {sends['expired']} expired, "
+              f"{sends['flood_waits']} FloodWaits ({sends['paused']} accounts paused)")
+        
+        pool = self.account_manager.get_pool_stats()
+        print(f"🔗 Clients: {pool['connected']}/{pool['accounts']} connected, "
+              f"{pool['connects']} connects, {pool['evictions']} evictions, "
+              f"{pool['overshoots']} over the limit")
+        
+        budget = self.message_handler.get_budget_stats()
+        print(f"💸 LLM budget: {budget['calls_used']} calls used, {budget['calls_saved']} saved, "
+              f"fallback ratio {budget['fallback_ratio']:.0%} of {budget['responses']} replies")
+        
+        candidates = self.message_handler.get_candidate_stats()
+        print(f"🎯 LLM candidates: {candidates['per_call']:.1f} per call, "
+              f"{candidates['no_valid']} of {candidates['calls']} calls had no valid one")
+        
+        duplicates = self.message_handler.get_duplicate_stats()
+        print(f"🔁 Near-duplicates: {duplicates['duplicates']} rejected of {duplicates['lookups']} checks "
+              f"({duplicates['entries']} recent messages indexed)")
     
     async def stop_simulation(self):
         """Stop simulation"""
         self.is_running = False
         print("🛑 Stopping...")
+        if self.stats_task:
+            self.stats_task.cancel()
+        if self.eviction_task:
+            self.eviction_task.cancel()
+        await self.reply_pipeline.stop()
+        await self.sender.stop()
         await self.account_manager.disconnect_all()
+        await self.message_handler.close()
         print("✅ Disconnected")
@@ -1,53 +1,405 @@
 import json
 import csv
-from datetime import datetime
 import os
+import queue
+import threading
+import time
+import atexit
+import mmap
+import struct
+import zlib
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from config import LOG_FLUSH_INTERVAL, LOG_FSYNC_INTERVAL, LOG_BATCH_SIZE
+
+CSV_HEADER = ['timestamp', 'account', 'message', 'personality', 'group_id']
+
+# Index record: byte offset, line length, unix timestamp, crc32(account)
+INDEX_RECORD = struct.Struct('<QIdI')
+
+
+def parse_timestamp(value):
+    """ISO timestamp (or datetime / number) -> unix seconds"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def account_hash(account):
+    return zlib.crc32(str(account).encode('utf-8'))
+
+
+class IndexView:
+    """Read-only view over the fixed-width offset index"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.count = len(buffer) // INDEX_RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return INDEX_RECORD.unpack_from(self.buffer, i * INDEX_RECORD.size)
+
+
+class _TimestampKeys:
+    """Lets bisect search the index by timestamp without copying it"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        return self.index[i][2]
 
 class ChatLogger:
     def __init__(self):
-        self.log_file = "chat_logs.json"
+        self.log_file = "chat_logs.jsonl"
+        self.legacy_log_file = "chat_logs.json"
         self.csv_file = "chat_logs.csv"
+        self.index_file = "chat_logs.idx"
+        self.queue = queue.Queue()
+        # Index timestamps never go backwards (see _index_record)
+        self.last_index_time = 0.0
+        self._stop = object()
+        self._closed = False
+
+        self.migrate_legacy_log()
         self.ensure_files_exist()
-    
+        self.migrate_csv_header()
+        self.log_size = self.sync_index()
+
+        # Background writer owns the file handles
+        self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
+        atexit.register(self.close)
+
     def ensure_files_exist(self):
         """Create log files if they don't exist"""
-        if not os.path.exists(self.log_file):
-            with open(self.log_file, 'w') as f:
-                json.dump([], f)
-        
+        for path in (self.log_file, self.index_file):
+            if not os.path.exists(path):
+                open(path, 'ab').close()
+
         if not os.path.exists(self.csv_file):
-            with open(self.csv_file, 'w', newline='') as f:
+            with open(self.csv_file, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
-                writer.writerow(['timestamp', 'account', 'message', 'personality'])
-    
-    def log_message(self, account_name, message, personality):
-        """Log message to JSON and CSV"""
-        timestamp = datetime.now().isoformat()
-        
-        # JSON logging
-        log_entry = {
-            'timestamp': timestamp,
+                writer.writerow(CSV_HEADER)
+
+    def migrate_legacy_log(self):
+        """Convert old chat_logs.json array into append-only JSONL (one time)"""
+        if os.path.exists(self.log_file) or not os.path.exists(self.legacy_log_file):
+            return
+
+        try:
+            with open(self.legacy_log_file, 'r', encoding='utf-8') as f:
+                logs = json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"⚠️  Could not migrate {self.legacy_log_file}: {e}")
+            return
+
+        with open(self.log_file, 'w', encoding='utf-8') as f:
+            for entry in logs:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+        os.replace(self.legacy_log_file, self.legacy_log_file + '.migrated')
+        print(f"📦 Migrated {len(logs)} log entries to {self.log_file}")
+
+    def migrate_csv_header(self):
+        """Rewrite a CSV log written with older columns to CSV_HEADER (one time)"""
+        with open(self.csv_file, 'r', newline='', encoding='utf-8') as f:
+            header = next(csv.reader(f), None)
+        if header == CSV_HEADER:
+            return
+
+        tmp_path = self.csv_file + '.tmp'
+        count = 0
+        with open(self.csv_file, 'r', newline='', encoding='utf-8') as src, \
+                open(tmp_path, 'w', newline='', encoding='utf-8') as dst:
+            reader = csv.reader(src)
+            old_header = next(reader, None) or []
+            writer = csv.writer(dst)
+            writer.writerow(CSV_HEADER)
+            for row in reader:
+                values = dict(zip(old_header, row))
+                writer.writerow([values.get(key, '') for key in CSV_HEADER])
+                count += 1
+
+        os.replace(tmp_path, self.csv_file)
+        print(f"📦 Upgraded {count} rows in {self.csv_file} to columns {', '.join(CSV_HEADER)}")
+
+    def sync_index(self):
+        """Bring the offset index in line with the log after a crash or upgrade.
+
+        Returns the log size in bytes. Only the unindexed tail of the log is
+        scanned, so this is cheap on a normal start. A torn last line (a
+        write cut short) is cut off so new entries start on a fresh line.
+        """
+        log_size = os.path.getsize(self.log_file)
+        index_size = os.path.getsize(self.index_file)
+        valid = index_size - index_size % INDEX_RECORD.size
+        indexed_end = 0
+
+        with open(self.index_file, 'r+b') as idx_f:
+            # Drop torn records and records pointing past the end of the log
+            while valid:
+                idx_f.seek(valid - INDEX_RECORD.size)
+                offset, length, indexed_time, _ = INDEX_RECORD.unpack(idx_f.read(INDEX_RECORD.size))
+                if offset + length <= log_size:
+                    indexed_end = offset + length
+                    self.last_index_time = indexed_time
+                    break
+                valid -= INDEX_RECORD.size
+
+            if valid != index_size:
+                idx_f.truncate(valid)
+
+            if indexed_end >= log_size:
+                return log_size
+
+            # Index the tail of the log that was never indexed
+            added = 0
+            idx_f.seek(valid)
+            with open(self.log_file, 'rb') as log_f:
+                log_f.seek(indexed_end)
+                offset = indexed_end
+                for line in log_f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        entry = {}
+                    idx_f.write(self._index_record(offset, len(line), entry))
+                    offset += len(line)
+                    added += 1
+
+            if offset < log_size:
+                with open(self.log_file, 'r+b') as log_f:
+                    log_f.truncate(offset)
+                print(f"✂️  Dropped {log_size - offset} bytes of a torn log entry")
+                log_size = offset
+
+        if added:
+            print(f"🗂️  Indexed {added} log entries")
+        return log_size
+
+    def _index_record(self, offset, length, entry):
+        # The wall clock can step back (NTP, DST on naive times). The index
+        # is searched by bisect, so each indexed time is clamped to at
+        # least the previous one; the entry keeps its real timestamp
+        indexed_time = max(parse_timestamp(entry.get('timestamp')) or 0.0, self.last_index_time)
+        self.last_index_time = indexed_time
+        return INDEX_RECORD.pack(
+            offset,
+            length,
+            indexed_time,
+            account_hash(entry.get('account', ''))
+        )
+
+    def log_message(self, account_name, message, personality, group_id=None):
+        """Queue message for the background writer (constant cost)"""
+        entry = {
+            'timestamp': datetime.now().isoformat(),
             'account': account_name,
             'message': message,
             'personality': personality
         }
-        
-        with open(self.log_file, 'r+') as f:
-            logs = json.load(f)
-            logs.append(log_entry)
-            f.seek(0)
-            json.dump(logs, f, indent=2)
-        
-        # CSV logging
-        with open(self.csv_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([timestamp, account_name, message, personality])
-    
-    def get_logs(self, limit=None):
-        """Retrieve chat logs"""
-        with open(self.log_file, 'r') as f:
-            logs = json.load(f)
-        
+        if group_id is not None:
+            entry['group_id'] = group_id
+        self.queue.put(entry)
+
+    def _next_batch(self, wait):
+        """Wait for work, then collect up to LOG_BATCH_SIZE items within LOG_FLUSH_INTERVAL"""
+        try:
+            first = self.queue.get(timeout=wait)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+
+        while len(batch) < LOG_BATCH_SIZE:
+            # Flush requests and shutdown cut the wait short
+            if not isinstance(batch[-1], dict):
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _writer_loop(self):
+        """Append batches to JSONL, index and CSV, fsync every LOG_FSYNC_INTERVAL seconds"""
+        last_fsync = time.monotonic()
+        dirty = False
+        offset = self.log_size
+
+        with open(self.log_file, 'ab') as log_f, \
+                open(self.index_file, 'ab') as idx_f, \
+                open(self.csv_file, 'a', newline='', encoding='utf-8') as csv_f:
+            csv_writer = csv.writer(csv_f)
+
+            while True:
+                # Only wake up on a timer while there is unsynced data
+                batch = self._next_batch(LOG_FSYNC_INTERVAL if dirty else None)
+                entries = [item for item in batch if isinstance(item, dict)]
+
+                if entries:
+                    lines = []
+                    records = []
+                    for e in entries:
+                        line = (json.dumps(e, ensure_ascii=False) + '\n').encode('utf-8')
+                        lines.append(line)
+                        records.append(self._index_record(offset, len(line), e))
+                        offset += len(line)
+
+                    # Log before index, so the index never points at missing data
+                    log_f.write(b''.join(lines))
+                    log_f.flush()
+                    idx_f.write(b''.join(records))
+                    idx_f.flush()
+                    csv_writer.writerows([e.get(key, '') for key in CSV_HEADER] for e in entries)
+                    csv_f.flush()
+                    self.log_size = offset
+                    dirty = True
+
+                stopping = self._stop in batch
+                now = time.monotonic()
+                if dirty and (stopping or now - last_fsync >= LOG_FSYNC_INTERVAL):
+                    os.fsync(log_f.fileno())
+                    os.fsync(idx_f.fileno())
+                    os.fsync(csv_f.fileno())
+                    last_fsync = now
+                    dirty = False
+
+                # Wake up anyone waiting in flush()
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+
+                if stopping:
+                    return
+
+    def flush(self, timeout=5):
+        """Block until everything queued so far is written"""
+        if self._closed:
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        """Drain the queue and stop the writer"""
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(self._stop)
+        self.writer_thread.join(timeout=10)
+
+    def iter_logs(self):
+        """Stream log entries from disk"""
+        self.flush()
+        with open(self.log_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def get_logs(self, limit=None, since=None, until=None, account=None, group_id=None):
+        """Retrieve chat logs, newest `limit` entries in chronological order.
+
+        Uses the offset index: the time range is found by binary search and
+        only the matching lines are read from the memory-mapped log, so
+        cost depends on the result size, not the history size.
+        """
+        logs = []
+        for entry in self.iter_range(since, until, account, reverse=bool(limit), group_id=group_id):
+            logs.append(entry)
+            if limit and len(logs) >= limit:
+                break
+
         if limit:
-            return logs[-limit:]
-        return logs
\ No newline at end of file
+            logs.reverse()
+        return logs
+
+    def iter_range(self, since=None, until=None, account=None, reverse=False, group_id=None):
+        """Stream entries between `since` and `until` (ISO string, datetime or
+        unix time), optionally for one account and/or group, without loading
+        the history"""
+        self.flush()
+
+        log_size = os.path.getsize(self.log_file)
+        index_size = os.path.getsize(self.index_file)
+        if not log_size or index_size < INDEX_RECORD.size:
+            return
+
+        with open(self.log_file, 'rb') as log_f, open(self.index_file, 'rb') as idx_f:
+            log_mm = mmap.mmap(log_f.fileno(), 0, access=mmap.ACCESS_READ)
+            idx_mm = mmap.mmap(idx_f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                index = IndexView(idx_mm)
+                keys = _TimestampKeys(index)
+                start = bisect_left(keys, parse_timestamp(since)) if since is not None else 0
+                stop = bisect_right(keys, parse_timestamp(until)) if until is not None else len(index)
+                wanted = account_hash(account) if account is not None else None
+
+                positions = range(stop - 1, start - 1, -1) if reverse else range(start, stop)
+                for i in positions:
+                    offset, length, _, acc_hash = index[i]
+                    if wanted is not None and acc_hash != wanted:
+                        continue
+                    entry = json.loads(log_mm[offset:offset + length])
+                    # crc32 can collide, confirm on the real value
+                    if account is not None and entry.get('account') != account:
+                        continue
+                    if group_id is not None and entry.get('group_id') != group_id:
+                        continue
+                    yield entry
+            finally:
+                idx_mm.close()
+                log_mm.close()
+
+    def export_json(self, path=None):
+        """Export logs in the original chat_logs.json format"""
+        path = path or self.legacy_log_file
+        count = 0
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('[')
+            for entry in self.iter_logs():
+                body = json.dumps(entry, indent=2).replace('\n', '\n  ')
+                f.write((',\n  ' if count else '\n  ') + body)
+                count += 1
+            f.write('\n]' if count else ']')
+
+        print(f"📤 Exported {count} entries to {path}")
+        return path
+
+    def export_csv(self, path=None):
+        """Export logs as CSV"""
+        path = path or self.csv_file.replace('.csv', '_export.csv')
+        count = 0
+
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+            for entry in self.iter_logs():
+                writer.writerow([entry.get(key, '') for key in CSV_HEADER])
+                count += 1
+
+        print(f"📤 Exported {count} entries to {path}")
+        return path
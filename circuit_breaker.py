@@ -0,0 +1,102 @@
+"""
+Circuit breaker for the LLM backend
+"""
+import time
+from collections import deque
+from config import (
+    LLM_BREAKER_WINDOW,
+    LLM_BREAKER_FAILURE_RATIO,
+    LLM_BREAKER_MIN_CALLS,
+    LLM_BREAKER_OPEN_SECONDS,
+    LLM_BREAKER_HALF_OPEN_PROBES
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    def __init__(self, window=LLM_BREAKER_WINDOW, failure_ratio=LLM_BREAKER_FAILURE_RATIO,
+                 min_calls=LLM_BREAKER_MIN_CALLS, open_seconds=LLM_BREAKER_OPEN_SECONDS,
+                 half_open_probes=LLM_BREAKER_HALF_OPEN_PROBES):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        # Rolling window of call outcomes (True = success)
+        self.results = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+
+        self.times_opened = 0
+        self.rejected = 0
+
+    def _refresh(self):
+        """Move OPEN -> HALF_OPEN once the cool-down has passed"""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+
+    def is_open(self):
+        """True while calls would be rejected (doesn't use up a probe)"""
+        self._refresh()
+        if self.state == OPEN:
+            return True
+        return self.state == HALF_OPEN and self.probes_in_flight >= self.half_open_probes
+
+    def allow_request(self):
+        """Ask permission for a call, counts a probe when half-open"""
+        self._refresh()
+
+        if self.state == CLOSED:
+            return True
+
+        if self.state == HALF_OPEN and self.probes_in_flight < self.half_open_probes:
+            self.probes_in_flight += 1
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            # Probe made it through - backend is back
+            self.state = CLOSED
+            self.results.clear()
+            print("🟢 LLM circuit closed")
+        self.results.append(True)
+
+    def record_failure(self):
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+
+        self.results.append(False)
+        failures = self.results.count(False)
+        if len(self.results) >= self.min_calls and failures / len(self.results) >= self.failure_ratio:
+            self._open()
+
+    def record_cancelled(self):
+        """Call was abandoned (e.g. lost a hedge race) - no verdict"""
+        if self.state == HALF_OPEN and self.probes_in_flight:
+            self.probes_in_flight -= 1
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probes_in_flight = 0
+        self.results.clear()
+        self.times_opened += 1
+        print(f"🔴 LLM circuit open - using fallbacks for {self.open_seconds}s")
+
+    def get_stats(self):
+        self._refresh()
+        return {
+            'state': self.state,
+            'window_calls': len(self.results),
+            'window_failures': self.results.count(False),
+            'times_opened': self.times_opened,
+            'rejected': self.rejected
+        }
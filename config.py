@@ -10,14 +10,103 @@ load_dotenv()
 LLM_API_URL = "http://XXX.XXX.20.30:5000/v1/chat"
 LLM_API_KEY = "Mygtafive"
 
+# Add more inference servers here to spread the load
+LLM_API_URLS = [LLM_API_URL]
+
+# LLM Endpoint Routing
+LLM_ROUTING = "ewma"  # "ewma" (latency x load) or "least_outstanding"
+LLM_EWMA_ALPHA = 0.3  # Weight of the newest latency sample
+LLM_ENDPOINT_MAX_ERRORS = 3  # Consecutive errors before ejecting an endpoint
+LLM_ENDPOINT_EJECT_SECONDS = 30  # Time an ejected endpoint sits out
+
+# LLM Connection Pool
+LLM_REQUEST_TIMEOUT = 8  # Max per-request deadline (seconds)
+LLM_MAX_CONCURRENT_REQUESTS = 8  # Max in-flight LLM calls per endpoint
+LLM_POOL_SIZE = 8  # Keep-alive connections per endpoint
+LLM_KEEPALIVE_TIMEOUT = 30  # Seconds an idle connection is kept
+LLM_STREAMING = False  # Stream replies and stop at the word limit (server must support "stream")
+LLM_CANDIDATES_PER_CALL = 3  # Completions asked for per request ("n"), the best valid one is used
+
+# LLM Circuit Breaker & Adaptive Timeout
+LLM_BREAKER_WINDOW = 20  # Recent calls used to judge health
+LLM_BREAKER_FAILURE_RATIO = 0.5  # Open when this share of calls fail
+LLM_BREAKER_MIN_CALLS = 5  # Don't judge on fewer calls
+LLM_BREAKER_OPEN_SECONDS = 15  # Fallback-only period before probing again
+LLM_BREAKER_HALF_OPEN_PROBES = 1  # Trial calls while recovering
+LLM_TIMEOUT_MIN = 2  # Adaptive timeout floor (seconds)
+LLM_TIMEOUT_MULTIPLIER = 2.0  # Timeout = p95 latency x this
+
+# LLM Call Budget (over budget = rule-based fallback replies)
+LLM_CALLS_PER_MINUTE_PER_GROUP = 30
+LLM_CALLS_PER_MINUTE_PER_CHARACTER = 10
+LLM_BUDGET_BURST = 5  # Calls that can be spent back-to-back
+
+# LLM Hedging
+LLM_HEDGE_MODE = "off"  # "off", "hedge" (backup request when slow) or "parallel"
+LLM_HEDGE_PERCENTILE = 90  # Fire the backup after this latency percentile
+LLM_HEDGE_MIN_DELAY = 1.5  # Backup delay until enough latency samples exist
+LLM_PARALLEL_CANDIDATES = 2  # Requests sent at once in "parallel" mode
+
 # Group Configuration
-GROUP_ID = -100XXXXXX671  # Your group ID
+GROUP_ID = -1001234567890  # Your group ID
+GROUP_IDS = [GROUP_ID]  # Every group to simulate in (the listener account must be in all)
+GROUP_HISTORY_SIZE = 10  # Messages remembered per group
+CONTEXT_CHAR_BUDGET = 240  # Characters of recent chat put into each prompt (0 = none)
+GROUP_DEDUPE_SIZE = 200  # Recent message ids kept per group for dedupe
+
+# Account Storage
+ACCOUNTS_DB_FILE = 'accounts.db'  # SQLite (WAL) database for accounts and sessions
+
+# Account Startup
+ACCOUNT_CONNECT_CONCURRENCY = 8  # Accounts connecting at the same time
+ACCOUNT_CONNECT_TIMEOUT = 30  # Seconds per account before giving up
+
+# Client Pool
+CLIENT_LAZY_CONNECT = True  # Connect accounts only when they speak or listen
+CLIENT_IDLE_TIMEOUT = 300  # Seconds before an idle client is disconnected (0 = never)
+CLIENT_POOL_MAX_CONNECTED = 10  # Connected clients before the least recently used is dropped
+CLIENT_WARMUP_DIALOGS = 100  # Dialogs loaded on connect so the group can be resolved
+
+# Sharded Run Mode
+SHARD_WORKERS = 0  # Worker processes holding the Telegram clients (0 = all in one process)
+SHARD_SOCKET = 'shards.sock'  # Local socket between the coordinator and its workers
+SHARD_START_TIMEOUT = 30  # Seconds to wait for all workers to come up
+
+# Response Cache
+RESPONSE_CACHE_SIZE = 500  # Max cached message keys
+RESPONSE_CACHE_TTL = 600  # Seconds a cached reply stays fresh
+RESPONSE_CACHE_CANDIDATES = 4  # Replies kept per key (for variety)
+
+# Near-Duplicate Suppression (across all accounts)
+DUPLICATE_WINDOW = 120  # Seconds a group message blocks look-alike replies
+DUPLICATE_MAX_ENTRIES = 2000  # Signatures kept before the oldest are dropped
+DUPLICATE_MAX_DISTANCE = 10  # SimHash bits (of 64) two messages may differ by and still match
 
 # Message Response Settings
 MIN_RESPONSE_WORDS = 3  # Minimum 3 words
 MAX_RESPONSE_WORDS = 6  # Maximum 6 words (STRICT)
 RESPONSE_PROBABILITY = 1.0
 
+# Reply Scheduling
+MAX_RESPONDERS_PER_MESSAGE = 1  # Accounts that answer each message
+GROUP_REPLIES_PER_MINUTE = 12  # Reply budget per group
+GROUP_BOT_REPLIES_PER_MINUTE = 6  # Part of it bot-to-bot replies may use, the rest is kept for real members
+TURN_MEMORY = 2  # Recent speakers that wait their turn
+
+# Reply Pipeline
+REPLY_WORKERS = 4  # Replies being prepared at the same time
+REPLY_QUEUE_SIZE = 20  # Queued replies before load shedding
+REPLY_MAX_AGE = 20  # Seconds before a queued reply is dropped as stale
+BOT_LANE_MAX_SHARE = 0.5  # Share of workers bot-to-bot replies may use
+STATS_REPORT_INTERVAL = 60  # Seconds between load reports
+
+# Telegram Send Limits (per account)
+SEND_RATE_PER_MINUTE = 20  # Sustained messages per minute
+SEND_BURST = 3  # Messages that may go out back-to-back
+SEND_MAX_RETRIES = 3  # Attempts for non-FloodWait errors
+SEND_RETRY_DELAY = 2  # Seconds, multiplied by the attempt number
+SEND_MAX_AGE = 30  # Seconds a queued message may wait (FloodWait, rate limit) before it is dropped
+
 # Message Timing Configuration
 BASE_COOLDOWN = 2  # Faster
 RANDOM_DELAY_MIN = 2
@@ -27,6 +116,11 @@ RANDOM_DELAY_MAX = 4  # Shorter delays
 MIN_MESSAGE_LENGTH = 3
 ALLOWED_LANGUAGES = ['en', 'ru']
 
+# Chat Log Writer
+LOG_FLUSH_INTERVAL = 0.5  # Max seconds a log entry waits before being written
+LOG_FSYNC_INTERVAL = 5.0  # Seconds between fsyncs (0 = every batch)
+LOG_BATCH_SIZE = 200  # Max entries per write
+
 # Mood System
 ENABLE_MOOD_SYSTEM = True
 MOOD_CHANGE_CHANCE = 0.30  # 30% chance
@@ -0,0 +1,149 @@
+"""
+Time-windowed SimHash index of recent group messages for near-duplicate lookup
+"""
+import hashlib
+import re
+import time
+from collections import deque
+from functools import lru_cache
+from itertools import combinations
+from config import DUPLICATE_WINDOW, DUPLICATE_MAX_ENTRIES, DUPLICATE_MAX_DISTANCE
+
+SIGNATURE_BITS = 64
+BANDS = 4
+BAND_BITS = SIGNATURE_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+NON_WORD = re.compile(r'[^a-z0-9\s]')
+
+@lru_cache(maxsize=20000)
+def trigram_bits(trigram):
+    """64-bit hash of a trigram as a '0'/'1' string, most significant bit first"""
+    digest = hashlib.blake2b(trigram.encode(), digest_size=8).digest()
+    return format(int.from_bytes(digest, 'big'), '064b')
+
+def probe_masks(radius):
+    """Every band-wide XOR mask flipping at most `radius` bits"""
+    masks = [0]
+    for flipped in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), flipped):
+            masks.append(sum(1 << bit for bit in bits))
+    return masks
+
+class DuplicateIndex:
+    def __init__(self, window=DUPLICATE_WINDOW, max_entries=DUPLICATE_MAX_ENTRIES,
+                 max_distance=DUPLICATE_MAX_DISTANCE):
+        self.window = window
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        # Signatures within max_distance bits differ by at most
+        # max_distance // BANDS bits in at least one band, so probing each
+        # band's neighbours within that radius finds every near-duplicate
+        self.masks = probe_masks(max_distance // BANDS)
+
+        # (added_at, group_id, signature), oldest first
+        self.entries = deque()
+        # (group_id, signature) -> when it was last added
+        self.latest = {}
+        # group_id -> one {band value: signatures} dict per band
+        self.buckets = {}
+
+        self.lookups = 0
+        self.duplicates = 0
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def signature(text):
+        """64-bit SimHash over character trigrams of the normalized text.
+        Cached - a reply is checked and then added with the same text."""
+        normalized = ' '.join(NON_WORD.sub('', text.lower()).split())
+        if not normalized:
+            return 0
+
+        padded = f" {normalized} "
+        rows = [trigram_bits(padded[i:i + 3]) for i in range(len(padded) - 2)]
+        # A bit is set when most trigrams have it set
+        half = len(rows) / 2
+        return int(''.join('1' if column.count('1') > half else '0' for column in zip(*rows)), 2)
+
+    @staticmethod
+    def bands(signature):
+        return [signature >> (band * BAND_BITS) & BAND_MASK for band in range(BANDS)]
+
+    def _expire(self):
+        """Drop entries older than the window, then the oldest over max_entries"""
+        cutoff = time.monotonic() - self.window
+        while self.entries and (self.entries[0][0] < cutoff or len(self.entries) > self.max_entries):
+            added_at, group_id, signature = self.entries.popleft()
+
+            # Re-added since - a newer entry still covers it
+            if self.latest.get((group_id, signature)) != added_at:
+                continue
+
+            del self.latest[(group_id, signature)]
+            group_bands = self.buckets[group_id]
+            for band_buckets, value in zip(group_bands, self.bands(signature)):
+                bucket = band_buckets[value]
+                bucket.discard(signature)
+                if not bucket:
+                    del band_buckets[value]
+            if not any(group_bands):
+                del self.buckets[group_id]
+
+    def add(self, group_id, text):
+        """Remember a message seen in (or about to be sent to) group_id"""
+        signature = self.signature(text)
+        if signature:
+            self.add_signature(group_id, signature)
+
+    def add_signature(self, group_id, signature):
+        added_at = time.monotonic()
+        self.entries.append((added_at, group_id, signature))
+        self.latest[(group_id, signature)] = added_at
+
+        group_bands = self.buckets.setdefault(group_id, [{} for _ in range(BANDS)])
+        for band_buckets, value in zip(group_bands, self.bands(signature)):
+            band_buckets.setdefault(value, set()).add(signature)
+
+        self._expire()
+
+    def is_duplicate(self, group_id, text):
+        """True if a near-identical message went to group_id within the window"""
+        self._expire()
+        self.lookups += 1
+
+        signature = self.signature(text)
+        if signature and self.find_near(group_id, signature) is not None:
+            self.duplicates += 1
+            return True
+        return False
+
+    def find_near(self, group_id, signature):
+        """A stored signature within max_distance bits of `signature`, or None"""
+        group_bands = self.buckets.get(group_id)
+        if not group_bands:
+            return None
+
+        # A quiet group holds fewer signatures than one band has probes -
+        # every signature is in each band, so walking one band is cheaper
+        if len(group_bands[0]) < len(self.masks):
+            candidates = [group_bands[0].values()]
+        else:
+            candidates = (
+                (band_buckets.get(value ^ mask, ()) for mask in self.masks)
+                for band_buckets, value in zip(group_bands, self.bands(signature))
+            )
+
+        for buckets in candidates:
+            for bucket in buckets:
+                for other in bucket:
+                    if bin(signature ^ other).count('1') <= self.max_distance:
+                        return other
+        return None
+
+    def get_stats(self):
+        return {
+            'entries': len(self.latest),
+            'lookups': self.lookups,
+            'duplicates': self.duplicates
+        }
@@ -0,0 +1,78 @@
+"""
+Per-group simulation state
+"""
+from collections import deque
+from datetime import datetime
+from config import GROUP_HISTORY_SIZE, GROUP_DEDUPE_SIZE, TURN_MEMORY, CONTEXT_CHAR_BUDGET
+
+class GroupState:
+    """Everything the simulation tracks for one group chat"""
+
+    def __init__(self, group_id, assigned_personalities):
+        self.group_id = group_id
+        # account name -> character key, each group has its own cast
+        self.assigned_personalities = assigned_personalities
+        # Telegram user id -> character key, set once accounts are known
+        self.characters_by_user_id = {}
+
+        self.history = deque(maxlen=GROUP_HISTORY_SIZE)
+        # Bumped on every new message, the context block is rebuilt lazily
+        self.history_version = 0
+        self.context_cache = (-1, "")
+
+        # Telegram message ids are per chat, so dedupe is too
+        self.seen_ids = set()
+        self.seen_order = deque()
+
+        # Reply budget (sliding 60s windows) and turn-taking memory
+        self.reply_times = deque()
+        # Replies to our own accounts, capped separately so bot chains
+        # can't spend the budget real members need
+        self.bot_reply_times = deque()
+        self.recent_speakers = deque(maxlen=TURN_MEMORY)
+
+    def get_character_key(self, account_name):
+        return self.assigned_personalities.get(account_name, "curious_teen")
+
+    def is_duplicate(self, message_id):
+        """True if message_id was seen, otherwise remember it"""
+        if message_id in self.seen_ids:
+            return True
+
+        self.seen_ids.add(message_id)
+        self.seen_order.append(message_id)
+        if len(self.seen_order) > GROUP_DEDUPE_SIZE:
+            self.seen_ids.discard(self.seen_order.popleft())
+        return False
+
+    def update_history(self, message, sender):
+        self.history.append({
+            'sender': sender,
+            'message': message,
+            'timestamp': datetime.now()
+        })
+        self.history_version += 1
+
+    def speaker_label(self, sender):
+        """Our accounts appear as their character, everyone else anonymously"""
+        character_key = self.assigned_personalities.get(sender)
+        return character_key.replace('_', ' ') if character_key else "someone"
+
+    def get_context(self, char_budget=CONTEXT_CHAR_BUDGET):
+        """Recent messages as 'speaker: text' lines, newest kept within char_budget"""
+        version, context = self.context_cache
+        if version == self.history_version:
+            return context
+
+        lines = []
+        used = 0
+        for entry in reversed(self.history):
+            line = f"{self.speaker_label(entry['sender'])}: {entry['message']}"
+            used += len(line) + 1
+            if used > char_budget:
+                break
+            lines.append(line)
+
+        context = "\n".join(reversed(lines))
+        self.context_cache = (self.history_version, context)
+        return context
@@ -0,0 +1,70 @@
+"""
+Multi-keyword matcher (Aho-Corasick) - one pass finds every keyword in a message
+"""
+from collections import deque
+
+class KeywordMatcher:
+    def __init__(self, keywords=None):
+        # Trie as parallel lists, node 0 is the root
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        self.built = False
+
+        for keyword, label in (keywords or {}).items():
+            self.add(keyword, label)
+        if keywords:
+            self.build()
+
+    def add(self, keyword, label):
+        """Report `label` whenever `keyword` occurs (matching is case-insensitive)"""
+        node = 0
+        for char in keyword.lower():
+            next_node = self.goto[node].get(char)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][char] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(set())
+            node = next_node
+        self.output[node] = self.output[node] | {label}
+        self.built = False
+
+    def build(self):
+        """Link failure transitions breadth-first, call once after the last add()"""
+        queue = deque(self.goto[0].values())
+        for node in queue:
+            self.fail[node] = 0
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                # A match at the suffix is a match here too
+                self.output[child] |= self.output[self.fail[child]]
+
+        # Output sets are read-only from here on
+        self.output = [frozenset(labels) for labels in self.output]
+        self.built = True
+
+    def labels(self, text):
+        """Labels of every keyword found in text"""
+        if not self.built:
+            self.build()
+
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        node = 0
+        for char in text.lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found |= output[node]
+        return found
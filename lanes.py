@@ -0,0 +1,9 @@
+"""
+Reply lanes - who a reply is for, in priority order
+"""
+
+# Real group members are always served first
+HUMAN = 0
+BOT = 1
+LANES = (HUMAN, BOT)
+LANE_NAMES = {HUMAN: "human", BOT: "bot"}
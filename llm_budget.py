@@ -0,0 +1,48 @@
+"""
+LLM call budget - token buckets per group and per character
+"""
+from rate_limit import TokenBucket
+from config import (
+    LLM_CALLS_PER_MINUTE_PER_GROUP,
+    LLM_CALLS_PER_MINUTE_PER_CHARACTER,
+    LLM_BUDGET_BURST
+)
+
+class LLMBudget:
+    def __init__(self):
+        self.group_buckets = {}
+        self.character_buckets = {}
+
+        self.calls_used = 0
+        self.calls_saved = 0
+
+    def get_bucket(self, buckets, key, per_minute):
+        if key not in buckets:
+            buckets[key] = TokenBucket(per_minute / 60, min(LLM_BUDGET_BURST, per_minute))
+        return buckets[key]
+
+    def buckets_for(self, group_id, character_key):
+        return (
+            self.get_bucket(self.group_buckets, group_id, LLM_CALLS_PER_MINUTE_PER_GROUP),
+            self.get_bucket(self.character_buckets, (group_id, character_key), LLM_CALLS_PER_MINUTE_PER_CHARACTER)
+        )
+
+    def has_budget(self, group_id, character_key):
+        """Check without spending"""
+        return all(bucket.has_tokens() for bucket in self.buckets_for(group_id, character_key))
+
+    def try_acquire(self, group_id, character_key):
+        """Spend one LLM call, False when over budget"""
+        buckets = self.buckets_for(group_id, character_key)
+
+        if not all(bucket.has_tokens() for bucket in buckets):
+            return False
+
+        for bucket in buckets:
+            bucket.try_consume()
+        self.calls_used += 1
+        return True
+
+    def note_skipped(self):
+        """A reply went without the LLM because the budget was spent"""
+        self.calls_saved += 1
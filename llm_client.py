@@ -0,0 +1,294 @@
+"""
+Async LLM client with pooled keep-alive connections
+"""
+import asyncio
+import json
+import time
+from collections import deque
+import aiohttp
+from config import (
+    LLM_API_URLS,
+    LLM_API_KEY,
+    LLM_REQUEST_TIMEOUT,
+    LLM_MAX_CONCURRENT_REQUESTS,
+    LLM_POOL_SIZE,
+    LLM_KEEPALIVE_TIMEOUT,
+    LLM_TIMEOUT_MIN,
+    LLM_TIMEOUT_MULTIPLIER,
+    LLM_ROUTING,
+    LLM_EWMA_ALPHA,
+    LLM_ENDPOINT_MAX_ERRORS,
+    LLM_ENDPOINT_EJECT_SECONDS
+)
+from circuit_breaker import CircuitBreaker
+
+class Endpoint:
+    """One inference server and its health numbers"""
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.ewma_latency = None
+        self.consecutive_errors = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+
+        # Created lazily so it binds to the running event loop
+        self.semaphore = None
+
+    def is_ejected(self, now):
+        return now < self.ejected_until
+
+    def load_score(self):
+        """Lower is better. Unmeasured endpoints go first so they get sampled."""
+        latency = self.ewma_latency or 0.0
+        if LLM_ROUTING == "least_outstanding":
+            return (self.outstanding, latency)
+        return (latency * (self.outstanding + 1), self.outstanding)
+
+    def observe(self, latency):
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = LLM_EWMA_ALPHA * latency + (1 - LLM_EWMA_ALPHA) * self.ewma_latency
+
+    def record_success(self, latency):
+        self.observe(latency)
+        self.consecutive_errors = 0
+
+    def record_failure(self, penalty):
+        # A failed call costs the caller a whole deadline, so fast errors
+        # (connection refused) must not make an endpoint look attractive
+        self.observe(penalty)
+        self.errors += 1
+        self.consecutive_errors += 1
+
+        if self.consecutive_errors >= LLM_ENDPOINT_MAX_ERRORS:
+            self.ejected_until = time.monotonic() + LLM_ENDPOINT_EJECT_SECONDS
+            self.ejections += 1
+            # One more failure after re-admission ejects it again
+            self.consecutive_errors = LLM_ENDPOINT_MAX_ERRORS - 1
+            print(f"⏏️  LLM endpoint {self.url} ejected for {LLM_ENDPOINT_EJECT_SECONDS}s")
+
+    def get_stats(self, now):
+        return {
+            'url': self.url,
+            'outstanding': self.outstanding,
+            'ewma_latency': self.ewma_latency,
+            'requests': self.requests,
+            'errors': self.errors,
+            'ejections': self.ejections,
+            'ejected': self.is_ejected(now)
+        }
+
+
+class LLMClient:
+    def __init__(self, api_urls=None, api_key=LLM_API_KEY):
+        self.endpoints = [Endpoint(url) for url in (api_urls or LLM_API_URLS)]
+        self.api_key = api_key
+        self.timeout = LLM_REQUEST_TIMEOUT
+        self.max_concurrent = LLM_MAX_CONCURRENT_REQUESTS
+
+        # Recent request latencies (seconds), timeouts count as the deadline
+        self.latencies = deque(maxlen=200)
+        self.breaker = CircuitBreaker()
+
+        # Created lazily so it binds to the running event loop
+        self._session = None
+
+    def get_session(self):
+        """Get (or create) the shared keep-alive session"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=LLM_POOL_SIZE * len(self.endpoints),
+                limit_per_host=LLM_POOL_SIZE,
+                keepalive_timeout=LLM_KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Authorization": self.api_key}
+            )
+        return self._session
+
+    def get_semaphore(self, endpoint):
+        """Get (or create) the per-endpoint concurrency limiter"""
+        if endpoint.semaphore is None:
+            endpoint.semaphore = asyncio.Semaphore(self.max_concurrent)
+        return endpoint.semaphore
+
+    def pick_endpoint(self):
+        """Healthiest endpoint by LLM_ROUTING. If every endpoint is ejected,
+        the one due back soonest is used as an early probe."""
+        now = time.monotonic()
+        healthy = [ep for ep in self.endpoints if not ep.is_ejected(now)]
+
+        if not healthy:
+            return min(self.endpoints, key=lambda ep: ep.ejected_until)
+        return min(healthy, key=lambda ep: ep.load_score())
+
+    def is_available(self):
+        """False while the circuit breaker is open (only a peek - request()
+        is what asks the breaker and counts rejections)"""
+        return not self.breaker.is_open()
+
+    def get_timeout(self):
+        """Deadline adapted to observed p95 latency, capped at LLM_REQUEST_TIMEOUT"""
+        p95 = self.latency_percentile(95)
+        if p95 is None:
+            return self.timeout
+        return max(LLM_TIMEOUT_MIN, min(self.timeout, p95 * LLM_TIMEOUT_MULTIPLIER))
+
+    async def post(self, payload, timeout=None):
+        """POST payload to the LLM, return parsed JSON or None"""
+        return await self.request(payload, self._read_json, timeout)
+
+    async def stream(self, payload, should_stop, timeout=None):
+        """POST a streaming request and collect text until should_stop(text).
+
+        Leaving the response early closes the connection, which tells the
+        server to stop generating. Returns the text so far, or None on error.
+        """
+        return await self.request(payload, lambda response: self._read_stream(response, should_stop), timeout)
+
+    async def request(self, payload, reader, timeout=None):
+        """Send payload to the best endpoint and hand the response to reader.
+
+        The deadline covers waiting for a free slot as well as the
+        request itself, so a backed-up server can't stall a reply forever.
+        """
+        if not self.breaker.allow_request():
+            return None
+
+        deadline = timeout or self.get_timeout()
+        endpoint = self.pick_endpoint()
+        endpoint.requests += 1
+        endpoint.outstanding += 1
+        started = time.monotonic()
+
+        try:
+            result = await asyncio.wait_for(self._post(endpoint, payload, reader), deadline)
+        except asyncio.TimeoutError:
+            self.latencies.append(deadline)
+            endpoint.record_failure(deadline)
+            self.breaker.record_failure()
+            return None
+        except (aiohttp.ClientError, ValueError):
+            endpoint.record_failure(deadline)
+            self.breaker.record_failure()
+            return None
+        except asyncio.CancelledError:
+            self.breaker.record_cancelled()
+            raise
+        finally:
+            endpoint.outstanding -= 1
+
+        latency = time.monotonic() - started
+        if result is None:
+            endpoint.record_failure(deadline)
+            self.breaker.record_failure()
+        else:
+            self.latencies.append(latency)
+            endpoint.record_success(latency)
+            self.breaker.record_success()
+        return result
+
+    async def _post(self, endpoint, payload, reader):
+        async with self.get_semaphore(endpoint):
+            session = self.get_session()
+            async with session.post(endpoint.url, json=payload) as response:
+                if response.status != 200:
+                    return None
+                return await reader(response)
+
+    async def _read_json(self, response):
+        return await response.json(content_type=None)
+
+    async def _read_stream(self, response, should_stop):
+        """Accumulate streamed text (SSE 'data:' lines or JSON lines)"""
+        text = ""
+
+        async for raw_line in response.content:
+            line = raw_line.strip()
+            if not line:
+                continue
+            if line in (b"[DONE]", b"data: [DONE]", b"data:[DONE]"):
+                break
+
+            text += self.extract_stream_text(line)
+            if should_stop(text):
+                break
+
+        return text
+
+    @staticmethod
+    def extract_stream_text(line):
+        """Text piece from one stream line, whatever shape the server uses.
+
+        SSE 'data:' payloads may be JSON or plain text; any other line that
+        isn't JSON (event names, ': keep-alive' comments) carries no text.
+        """
+        is_data = line.startswith(b"data:")
+        if is_data:
+            line = line[5:].strip()
+
+        try:
+            chunk = json.loads(line)
+        except ValueError:
+            return line.decode("utf-8", errors="ignore") if is_data else ""
+
+        if not isinstance(chunk, dict):
+            return ""
+
+        for key in ("token", "response", "text"):
+            if isinstance(chunk.get(key), str):
+                return chunk[key]
+
+        # OpenAI-style chunks
+        choices = chunk.get("choices") or [{}]
+        choice = choices[0]
+        delta = choice.get("delta") or {}
+        return delta.get("content") or choice.get("text") or ""
+
+    @staticmethod
+    def extract_texts(result):
+        """Every completion in a (possibly n-best) response, whatever shape the server uses"""
+        if not isinstance(result, dict):
+            return []
+
+        responses = result.get("responses")
+        if isinstance(responses, list):
+            return [text for text in responses if isinstance(text, str)]
+
+        if isinstance(result.get("response"), str):
+            return [result["response"]]
+
+        # OpenAI-style choices
+        texts = []
+        for choice in result.get("choices") or []:
+            if not isinstance(choice, dict):
+                continue
+            message = choice.get("message") or {}
+            text = message.get("content") or choice.get("text")
+            if isinstance(text, str):
+                texts.append(text)
+        return texts
+
+    def latency_percentile(self, percentile, min_samples=20):
+        """Observed latency at the given percentile, None until enough samples"""
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+    def get_endpoint_stats(self):
+        now = time.monotonic()
+        return [ep.get_stats(now) for ep in self.endpoints]
+
+    async def close(self):
+        """Close pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -8,6 +8,8 @@ from personality_manager import PersonalityManager
 from message_handler import MessageHandler
 from bot_controller import BotController
 from chat_logger import ChatLogger
+from shard_manager import ShardCoordinator
+from config import SHARD_WORKERS
 
 class TelegramSimulation:
     def __init__(self):
@@ -15,8 +17,11 @@ class TelegramSimulation:
         self.personality_manager = PersonalityManager()
         self.message_handler = MessageHandler(self.personality_manager)
         self.chat_logger = ChatLogger()
+        
+        # Telegram clients can live in worker processes, one core each
+        clients = ShardCoordinator(self.account_manager) if SHARD_WORKERS else self.account_manager
         self.controller = BotController(
-            self.account_manager,
+            clients,
             self.personality_manager,
             self.message_handler,
             self.chat_logger
@@ -50,7 +55,8 @@ class TelegramSimulation:
         account_name = input("\nEnter account name: ").strip()
         
         if account_name:
-            current_status = any(acc['name'] == account_name and acc.get('is_active', True) for acc in self.account_manager.accounts)
+            account = self.account_manager.get_account(account_name)
+            current_status = bool(account and account.get('is_active', True))
             new_status = not current_status
             action = "enable" if new_status else "disable"
             
@@ -121,6 +127,39 @@ class TelegramSimulation:
         print(f"✅ Active Accounts: {active_accounts}")
         print(f"🎭 Personalities Ready: {len(self.personality_manager.get_assigned_personalities())}")
         
+        cache = self.message_handler.response_cache.get_stats()
+        print(f"⚡ Response Cache: {cache['hits']} hits / {cache['misses']} misses "
+              f"({cache['hit_ratio']:.0%}), {cache['entries']} entries")
+        
+        breaker = self.message_handler.llm_client.breaker.get_stats()
+        print(f"🔌 LLM Circuit: {breaker['state']} (opened {breaker['times_opened']}x, "
+              f"{breaker['rejected']} calls sent to fallback), "
+              f"timeout {self.message_handler.llm_client.get_timeout():.1f}s")
+        
+        endpoints = self.message_handler.llm_client.get_endpoint_stats()
+        if len(endpoints) > 1:
+            print("🖥️  LLM Endpoints:")
+            for ep in endpoints:
+                latency = f"{ep['ewma_latency']:.2f}s" if ep['ewma_latency'] is not None else "n/a"
+                status = "⏏️ ejected" if ep['ejected'] else "✅"
+                print(f"   {status} {ep['url']} | {ep['requests']} req, {ep['errors']} err, "
+                      f"{ep['outstanding']} in flight, ewma {latency}")
+        
+        budget = self.message_handler.get_budget_stats()
+        print(f"💸 LLM Budget: {budget['calls_used']} calls used, {budget['calls_saved']} saved, "
+              f"fallback ratio {budget['fallback_ratio']:.0%} of {budget['responses']} replies")
+        
+        stream = self.message_handler.stream_stats
+        if stream['streams']:
+            print(f"🌊 LLM Streaming: {stream['streams']} streams, stopped early at word limit "
+                  f"{stream['word_limit_stops']}x / sentence end {stream['sentence_stops']}x, "
+                  f"{stream['aborted']} aborted as invalid")
+        
+        hedge = self.message_handler.get_hedge_stats()
+        if hedge['requests']:
+            print(f"🏁 LLM Hedging: {hedge['requests']} requests, {hedge['hedges']} hedges, "
+                  f"{hedge['wins']} wins ({hedge['backup_wins']} by backup), {hedge['wasted']} wasted")
+        
         if self.personality_manager.get_assigned_personalities():
             print("\n🎭 Current Personality Assignment:")
             for account, personality in self.personality_manager.get_assigned_personalities().items():
@@ -162,6 +201,7 @@ class TelegramSimulation:
             elif choice == '5':
                 print("👋 Exiting...")
                 await self.account_manager.disconnect_all()
+                await self.message_handler.close()
                 break
             else:
                 print("❌ Invalid option!")
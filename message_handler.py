@@ -1,222 +1,450 @@
-import requests
 import random
 import asyncio
 import re
-from datetime import datetime
-from config import LLM_API_URL, LLM_API_KEY
+from llm_client import LLMClient
+from response_cache import ResponseCache
+from llm_budget import LLMBudget
+from keyword_matcher import KeywordMatcher
+from response_validator import ResponseValidator, REPLY_WORD_LIMIT, REPLY_MIN_WORDS
+from duplicate_index import DuplicateIndex
+from config import (
+    GROUP_ID,
+    LLM_HEDGE_MODE,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_PARALLEL_CANDIDATES,
+    LLM_STREAMING,
+    LLM_CANDIDATES_PER_CALL
+)
+
+SENTENCE_END = re.compile(r'\w[.!?\n]')
+
+# Sender character -> telltale keywords, checked in this order
+SENDER_KEYWORDS = {
+    "girl": ['aww', 'cute', 'sweet', 'maybe later', 'busy'],
+    "flirty_boy": ['beautiful', 'pretty', 'wanna hang', 'thinking about you'],
+    "mature_guy": ['listen', 'trust me', 'from experience', 'heres the trick'],
+    "curious_teen": ['?', 'how', 'why', 'what', 'can you explain'],
+    "hustler": ['money', 'business', 'opportunity', 'earning', 'investment']
+}
+
+# Character -> topics that get an on-topic fallback
+FALLBACK_TOPICS = {
+    "hustler_1": ['money', 'business', 'idea'],
+    "hustler_2": ['opportunity', 'business', 'start']
+}
+
+def build_keyword_matcher():
+    """One matcher for every keyword list, labelled ('sender' | 'topic', character)"""
+    matcher = KeywordMatcher()
+    for kind, vocabulary in (('sender', SENDER_KEYWORDS), ('topic', FALLBACK_TOPICS)):
+        for character_key, keywords in vocabulary.items():
+            for keyword in keywords:
+                matcher.add(keyword, (kind, character_key))
+    matcher.build()
+    return matcher
+
+KEYWORDS = build_keyword_matcher()
+
+# Character-specific response style
+CHARACTER_STYLES = {
+    "flirty_boy": {
+        "examples": "hey beautiful | you look nice | wanna hang out | thinking of you",
+        "tone": "flirty and trying to impress"
+    },
+    "girl": {
+        "examples": "haha thanks | maybe later | busy rn | aww thats sweet | not interested",
+        "tone": "sometimes interested, sometimes cold"
+    },
+    "mature_guy": {
+        "examples": "listen bro | heres the thing | trust me | from my experience",
+        "tone": "wise and helpful"
+    },
+    "curious_teen": {
+        "examples": "how does that work | can you teach me | really bro | i dont get it",
+        "tone": "curious and asking questions"
+    },
+    "hustler_1": {
+        "examples": "new opportunity bro | easy money | lets start this | dropshipping idea",
+        "tone": "entrepreneur mindset"
+    },
+    "hustler_2": {
+        "examples": "sounds good | whats the plan | im down | how much investment",
+        "tone": "supportive hustler"
+    }
+}
+
+# Static tail of every character prompt
+PROMPT_TAIL = """Your vibe: {tone}
+
+How you talk:
+{examples}
+
+Reply naturally (3-5 words):"""
+
+# (responder character, sender character) -> prompt hint
+CHARACTER_RELATIONSHIPS = {
+    ("girl", "flirty_boy"): "A boy is flirting with you. Sometimes show interest, sometimes be cold.",
+    ("flirty_boy", "girl"): "The girl you like replied. Keep flirting but be cool.",
+    ("curious_teen", "mature_guy"): "The mature guy is sharing wisdom. Ask follow-up questions.",
+    ("mature_guy", "curious_teen"): "The teen asked something. Give helpful advice."
+}
 
 class MessageHandler:
     def __init__(self, personality_manager):
         self.personality_manager = personality_manager
-        self.conversation_history = []
+        self.prompt_parts = self.build_prompt_parts()
         self.account_response_history = {}
-        
-    async def generate_response(self, account_name, message_context, original_message=""):
+        self.validator = ResponseValidator()
+        # Recent group messages from every account, to catch cross-account echoes
+        self.duplicate_index = DuplicateIndex()
+        self.llm_client = LLMClient()
+        self.response_cache = ResponseCache()
+        self.llm_budget = LLMBudget()
+        self.response_sources = {'llm': 0, 'cache': 0, 'fallback': 0}
+        self.hedge_stats = {
+            'requests': 0,
+            'hedges': 0,
+            'wins': 0,
+            'backup_wins': 0,
+            'no_winner': 0,
+            'wasted': 0
+        }
+        self.stream_stats = {
+            'streams': 0,
+            'word_limit_stops': 0,
+            'sentence_stops': 0,
+            'aborted': 0
+        }
+        self.candidate_stats = {
+            'calls': 0,
+            'candidates': 0,
+            'no_valid': 0
+        }
+        # Last message scanned and its keyword labels - detection and
+        # fallback look at the same message back to back
+        self.last_scan = (None, frozenset())
+        
+    def build_prompt_parts(self):
+        """Character key -> (head, tail) of its prompt, built once"""
+        parts = {}
+        for character_key, character in self.personality_manager.six_characters.items():
+            style = CHARACTER_STYLES.get(character_key, CHARACTER_STYLES["curious_teen"])
+            parts[character_key] = (
+                f"Friend group chat. You're a {character['age']} year old.\n\n",
+                PROMPT_TAIL.format(**style)
+            )
+        return parts
+    
+    async def generate_response(self, account_name, message_context, original_message="", sender_character=None,
+                                group_id=GROUP_ID, character_key=None):
         """Generate character-appropriate response"""
         
-        character_key = self.personality_manager.assigned_personalities.get(account_name, "curious_teen")
+        # Each group has its own cast, the caller passes the account's role there
+        if character_key is None:
+            character_key = self.personality_manager.assigned_personalities.get(account_name, "curious_teen")
         character = self.personality_manager.get_character_info(character_key)
         
         # Detect who sent the message (for relationship dynamics)
-        sender_character = self.detect_sender_character(original_message)
+        if sender_character is None:
+            sender_character = self.detect_sender_character(original_message)
+        
+        # Repeated phrases are answered from cache
+        cache_key = self.response_cache.make_key(character_key, sender_character, original_message)
+        cached = self.response_cache.lookup(
+            cache_key,
+            lambda candidate: self.is_valid_character_response(candidate, account_name, original_message, group_id)
+        )
+        if cached:
+            self.track_response(account_name, cached, group_id)
+            self.response_sources['cache'] += 1
+            print(f"⚡ {account_name} ({character['name']}): {cached} (cached)")
+            return cached
+        
+        # Try LLM (skipped while the circuit breaker is open or the budget is spent)
+        if not self.llm_client.is_available():
+            response = None
+        elif not self.llm_budget.has_budget(group_id, character_key):
+            self.llm_budget.note_skipped()
+            response = None
+        elif LLM_HEDGE_MODE in ("hedge", "parallel"):
+            response = await self.race_llm_candidates(
+                account_name, character, sender_character, original_message, group_id, message_context
+            )
+        else:
+            response = await self.sequential_llm_response(
+                account_name, character, sender_character, original_message, group_id, message_context
+            )
+        
+        if response:
+            self.response_cache.add(cache_key, response)
+            self.track_response(account_name, response, group_id)
+            self.response_sources['llm'] += 1
+            print(f"✅ {account_name} ({character['name']}): {response}")
+            return response
         
-        # Try LLM
+        # Character-based fallback
+        fallback = self.get_character_fallback(character_key, original_message, sender_character)
+        self.track_response(account_name, fallback, group_id)
+        self.response_sources['fallback'] += 1
+        return fallback
+    
+    async def sequential_llm_response(self, account_name, character, sender_character, original_message, group_id=GROUP_ID,
+                                      context=""):
+        """Up to two LLM attempts, one after another"""
         for attempt in range(2):
+            if not self.llm_client.is_available():
+                break
             response = await self.call_character_llm(
                 account_name,
                 character,
                 sender_character,
                 original_message,
-                attempt
+                attempt,
+                group_id,
+                context
             )
             
-            if response and self.is_valid_character_response(response, account_name, original_message):
-                self.track_response(account_name, response)
-                print(f"✅ {account_name} ({character['name']}): {response}")
+            # Already validated and duplicate-checked
+            if response:
                 return response
         
-        # Character-based fallback
-        fallback = self.get_character_fallback(character_key, original_message, sender_character)
-        self.track_response(account_name, fallback)
-        return fallback
+        return None
+    
+    def get_hedge_delay(self):
+        """Wait this long for the first request before firing a backup"""
+        observed = self.llm_client.latency_percentile(LLM_HEDGE_PERCENTILE)
+        return observed if observed is not None else LLM_HEDGE_MIN_DELAY
+    
+    async def race_llm_candidates(self, account_name, character, sender_character, original_message, group_id=GROUP_ID,
+                                  context=""):
+        """Race LLM requests, the first valid reply wins and the rest are cancelled.
+        
+        "hedge" sends a backup request once the first one is slower than the
+        observed p-percentile (or fails early); "parallel" sends
+        LLM_PARALLEL_CANDIDATES requests at once.
+        """
+        hedging = LLM_HEDGE_MODE == "hedge"
+        max_requests = 2 if hedging else LLM_PARALLEL_CANDIDATES
+        hedge_delay = self.get_hedge_delay()
+        stats = self.hedge_stats
+        
+        pending = {}
+        
+        def launch(attempt):
+            task = asyncio.create_task(self.call_character_llm(
+                account_name, character, sender_character, original_message, attempt, group_id, context
+            ))
+            pending[task] = attempt
+            stats['requests'] += 1
+        
+        launched = 0
+        for _ in range(1 if hedging else max_requests):
+            launch(launched)
+            launched += 1
+        
+        winner = None
+        try:
+            while pending and winner is None:
+                can_hedge = hedging and launched < max_requests
+                done, _ = await asyncio.wait(
+                    pending.keys(),
+                    timeout=hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                if not done:
+                    # First request is slow - fire the backup
+                    stats['hedges'] += 1
+                    launch(launched)
+                    launched += 1
+                    continue
+                
+                for task in done:
+                    attempt = pending.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception:
+                        response = None
+                    
+                    # Candidates come back validated and duplicate-checked
+                    if winner is None and response:
+                        winner = response
+                        stats['wins'] += 1
+                        if attempt > 0:
+                            stats['backup_wins'] += 1
+                    else:
+                        stats['wasted'] += 1
+                
+                # First request failed fast - don't wait for the hedge delay
+                if winner is None and not pending and hedging and launched < max_requests:
+                    stats['hedges'] += 1
+                    launch(launched)
+                    launched += 1
+        finally:
+            for task in pending:
+                task.cancel()
+                stats['wasted'] += 1
+        
+        if winner is None:
+            stats['no_winner'] += 1
+        return winner
+    
+    def get_hedge_stats(self):
+        return dict(self.hedge_stats)
+    
+    def get_budget_stats(self):
+        """LLM calls spent vs saved, and how many replies were fallbacks"""
+        total = sum(self.response_sources.values())
+        return {
+            'calls_used': self.llm_budget.calls_used,
+            'calls_saved': self.llm_budget.calls_saved,
+            'responses': total,
+            'fallbacks': self.response_sources['fallback'],
+            'fallback_ratio': self.response_sources['fallback'] / total if total else 0.0
+        }
+    
+    def get_candidate_stats(self):
+        """Completions per LLM call and how often none of them was usable"""
+        stats = dict(self.candidate_stats)
+        stats['per_call'] = stats['candidates'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
+    
+    def get_duplicate_stats(self):
+        return self.duplicate_index.get_stats()
+    
+    def keyword_labels(self, message):
+        """Every keyword label in message, from a single pass of the matcher"""
+        last_message, labels = self.last_scan
+        if message != last_message:
+            labels = frozenset(KEYWORDS.labels(message))
+            self.last_scan = (message, labels)
+        return labels
     
     def detect_sender_character(self, message):
         """Detect which character likely sent the message"""
-        msg_lower = message.lower()
-        
-        # Girl indicators
-        if any(w in msg_lower for w in ['aww', 'cute', 'sweet', 'maybe later', 'busy']):
-            return "girl"
-        
-        # Flirty boy indicators
-        if any(w in msg_lower for w in ['beautiful', 'pretty', 'wanna hang', 'thinking about you']):
-            return "flirty_boy"
-        
-        # Mature guy indicators
-        if any(w in msg_lower for w in ['listen', 'trust me', 'from experience', 'heres the trick']):
-            return "mature_guy"
-        
-        # Curious teen indicators (questions)
-        if '?' in message or any(w in msg_lower for w in ['how', 'why', 'what', 'can you explain']):
-            return "curious_teen"
-        
-        # Hustler indicators
-        if any(w in msg_lower for w in ['money', 'business', 'opportunity', 'earning', 'investment']):
-            return "hustler"
+        labels = self.keyword_labels(message)
+        for character_key in SENDER_KEYWORDS:
+            if ('sender', character_key) in labels:
+                return character_key
         
         return "unknown"
     
-    async def call_character_llm(self, account_name, character, sender_character, original_message, attempt):
-        """Call LLM with character-specific prompt"""
-        
-        recent = self.account_response_history.get(account_name, [])
-        
-        # Character-specific response style
-        character_styles = {
-            "flirty_boy": {
-                "examples": "hey beautiful | you look nice | wanna hang out | thinking of you",
-                "tone": "flirty and trying to impress"
-            },
-            "girl": {
-                "examples": "haha thanks | maybe later | busy rn | aww thats sweet | not interested",
-                "tone": "sometimes interested, sometimes cold"
-            },
-            "mature_guy": {
-                "examples": "listen bro | heres the thing | trust me | from my experience",
-                "tone": "wise and helpful"
-            },
-            "curious_teen": {
-                "examples": "how does that work | can you teach me | really bro | i dont get it",
-                "tone": "curious and asking questions"
-            },
-            "hustler_1": {
-                "examples": "new opportunity bro | easy money | lets start this | dropshipping idea",
-                "tone": "entrepreneur mindset"
-            },
-            "hustler_2": {
-                "examples": "sounds good | whats the plan | im down | how much investment",
-                "tone": "supportive hustler"
-            }
-        }
+    async def call_character_llm(self, account_name, character, sender_character, original_message, attempt,
+                                 group_id=GROUP_ID, context=""):
+        """Call LLM with character-specific prompt.
+        
+        Returns the best reply that passed validation and the duplicate
+        check, or None - callers don't need to validate it again.
+        """
         
         char_key = character.get('name', 'Curious Teen').lower().replace(' ', '_')
-        style = character_styles.get(char_key, character_styles["curious_teen"])
+        head, tail = self.prompt_parts.get(char_key) or self.prompt_parts["curious_teen"]
+        
+        # Over budget - caller falls back to rule-based replies
+        if not self.llm_budget.try_acquire(group_id, char_key):
+            return None
         
         # Build relationship-aware prompt
-        relationship_context = ""
-        if char_key == "girl" and sender_character == "flirty_boy":
-            relationship_context = "A boy is flirting with you. Sometimes show interest, sometimes be cold."
-        elif char_key == "flirty_boy" and sender_character == "girl":
-            relationship_context = "The girl you like replied. Keep flirting but be cool."
-        elif char_key == "curious_teen" and sender_character == "mature_guy":
-            relationship_context = "The mature guy is sharing wisdom. Ask follow-up questions."
-        elif char_key == "mature_guy" and sender_character == "curious_teen":
-            relationship_context = "The teen asked something. Give helpful advice."
-        
-        prompt = f"""Friend group chat. You're a {character['age']} year old.
-
-{relationship_context}
-
-They said: "{original_message}"
+        relationship_context = CHARACTER_RELATIONSHIPS.get((char_key, sender_character), "")
+        
+        # Recent chat (already trimmed to CONTEXT_CHAR_BUDGET by the group)
+        context_block = f"Recent chat:\n{context}\n\n" if context else ""
+        
+        prompt = f"""{head}{relationship_context}
 
-Your vibe: {style['tone']}
+{context_block}They said: "{original_message}"
 
-How you talk:
-{style['examples']}
-
-Reply naturally (3-5 words):"""
+{tail}"""
 
-        try:
-            response = requests.post(
-                LLM_API_URL,
-                headers={"Authorization": LLM_API_KEY},
-                json={
-                    "prompt": prompt,
-                    "max_tokens": 12,
-                    "temperature": 0.9,
-                    "top_p": 0.85,
-                    "frequency_penalty": 2.0,
-                    "presence_penalty": 1.5
-                },
-                timeout=8
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                reply = result.get('response', '').strip()
-                return self.clean_response(reply)
+        payload = {
+            "prompt": prompt,
+            "max_tokens": 12,
+            "temperature": 0.9,
+            "top_p": 0.85,
+            "frequency_penalty": 2.0,
+            "presence_penalty": 1.5
+        }
         
-        except:
+        if LLM_STREAMING:
+            payload["stream"] = True
+            self.stream_stats['streams'] += 1
+            reply = await self.llm_client.stream(payload, self.should_stop_stream)
+            if not reply:
+                return None
+            return self.best_response([self.clean_response(reply.strip())], account_name, original_message, group_id)
+        
+        # Several completions per round trip, so one failing validation
+        # doesn't cost another request
+        if LLM_CANDIDATES_PER_CALL > 1:
+            payload["n"] = LLM_CANDIDATES_PER_CALL
+        
+        result = await self.llm_client.post(payload)
+        if not result:
+            return None
+        
+        candidates = [self.clean_response(text.strip()) for text in self.llm_client.extract_texts(result)]
+        stats = self.candidate_stats
+        stats['calls'] += 1
+        stats['candidates'] += len(candidates)
+        
+        best = self.best_response(candidates, account_name, original_message, group_id)
+        if best is None:
+            stats['no_valid'] += 1
+        return best
+    
+    def should_stop_stream(self, text):
+        """Stop streaming once the reply is long enough or already invalid"""
+        # Hopeless already - validation would reject it anyway
+        if self.validator.has_banned(text.lower()):
+            self.stream_stats['aborted'] += 1
+            return True
+        
+        # A word past the limit has started, so the first words are complete
+        if len(text.split()) > REPLY_WORD_LIMIT:
+            self.stream_stats['word_limit_stops'] += 1
+            return True
+        
+        # Only a sentence that ends after enough words - "haha! thats sweet"
+        # must not be cut to a one-word "haha!"
+        last_end = None
+        for last_end in SENTENCE_END.finditer(text):
             pass
+        if last_end and len(text[:last_end.end()].split()) >= REPLY_MIN_WORDS:
+            self.stream_stats['sentence_stops'] += 1
+            return True
         
-        return None
+        return False
     
     def clean_response(self, text):
         """Clean response"""
-        if not text:
-            return ""
-        
-        # Remove emojis
-        text = re.sub(r'[^\x00-\x7F]+', '', text)
-        
-        # Remove hashtags
-        text = re.sub(r'#\w+', '', text)
-        
-        # Clean
-        text = text.strip('"\'`')
-        text = ' '.join(text.split())
-        
-        # Word limit
-        words = text.split()
-        if len(words) > 5:
-            text = ' '.join(words[:5])
-        
-        # Remove incomplete endings
-        text = text.rstrip(',')
-        bad_endings = [' the', ' a', ' to', ' of', ' in', ' and', ' or']
-        for ending in bad_endings:
-            if text.lower().endswith(ending):
-                words = text.split()
-                text = ' '.join(words[:-1])
-        
-        return text.strip()
+        return self.validator.clean(text)
     
-    def is_valid_character_response(self, response, bot_name, original_message):
+    def is_valid_character_response(self, response, bot_name, original_message, group_id=GROUP_ID):
         """Validate response"""
-        if not response or len(response.strip()) < 2:
-            return False
-        
-        # Word count
-        words = response.split()
-        if len(words) < 2 or len(words) > 5:
-            return False
-        
-        # No formal words
-        formal = ['indeed', 'perhaps', 'absolutely', 'marvelous', 'wonderful']
-        if any(word in response.lower() for word in formal):
-            return False
-        
-        # No rule leaks
-        if 'rule' in response.lower() or 'example' in response.lower():
-            return False
-        
-        # No copying
-        original_words = set(original_message.lower().split())
-        response_words = set(response.lower().split())
-        if len(original_words.intersection(response_words)) >= 2:
+        if not self.validator.is_valid(response, original_message, self.account_response_history.get(bot_name, [])):
             return False
         
-        # No repetition
-        recent = self.account_response_history.get(bot_name, [])
-        if response.lower() in recent[-2:]:
-            return False
-        
-        return True
+        # Someone in the group just said nearly the same thing
+        return not self.duplicate_index.is_duplicate(group_id, response)
+    
+    def best_response(self, candidates, bot_name, original_message, group_id=GROUP_ID):
+        """Highest-ranked valid candidate for bot_name that isn't a near-duplicate, or None"""
+        ranked = self.validator.rank(candidates, original_message, self.account_response_history.get(bot_name, []))
+        # Duplicate lookups are the costly part, stop at the first clean one
+        for candidate in ranked:
+            if not self.duplicate_index.is_duplicate(group_id, candidate):
+                return candidate
+        return None
+    
+    def remember_message(self, group_id, message):
+        """Record a message seen in the group so replies don't echo it"""
+        self.duplicate_index.add(group_id, message)
     
     def get_character_fallback(self, character_key, original_message, sender_character):
         """Character-specific fallbacks"""
         
-        msg_lower = original_message.lower()
+        labels = self.keyword_labels(original_message)
         
         # FLIRTY BOY fallbacks
         if character_key == "flirty_boy":
@@ -252,14 +480,14 @@ Reply naturally (3-5 words):"""
         
         # HUSTLER 1 fallbacks
         elif character_key == "hustler_1":
-            if any(w in msg_lower for w in ['money', 'business', 'idea']):
+            if ('topic', 'hustler_1') in labels:
                 return random.choice(["new opportunity bro", "easy money method", "lets do this", "im thinking dropshipping"])
             else:
                 return random.choice(["yeah man", "sounds good", "im down"])
         
         # HUSTLER 2 fallbacks
         elif character_key == "hustler_2":
-            if any(w in msg_lower for w in ['opportunity', 'business', 'start']):
+            if ('topic', 'hustler_2') in labels:
                 return random.choice(["whats the plan", "how much investment", "im interested", "lets try it"])
             else:
                 return random.choice(["cool bro", "makes sense", "true"])
@@ -267,8 +495,11 @@ Reply naturally (3-5 words):"""
         # Default
         return random.choice(["yeah", "okay", "cool"])
     
-    def track_response(self, bot_name, response):
+    def track_response(self, bot_name, response, group_id=GROUP_ID):
         """Track responses"""
+        # Claimed right away, so accounts answering in parallel don't echo it
+        self.remember_message(group_id, response)
+        
         if bot_name not in self.account_response_history:
             self.account_response_history[bot_name] = []
         
@@ -281,23 +512,12 @@ Reply naturally (3-5 words):"""
         """Typing delay"""
         return random.uniform(2, 4)
     
-    def update_conversation_history(self, message, sender, message_id=None):
-        """Track conversation"""
-        self.conversation_history.append({
-            'sender': sender,
-            'message': message,
-            'timestamp': datetime.now()
-        })
-        
-        if len(self.conversation_history) > 5:
-            self.conversation_history.pop(0)
-    
-    def get_conversation_context(self, limit=2):
-        """Get context"""
-        return ""
-    
     def should_respond(self, message_id):
         return True
     
     def mark_responded(self, message_id):
         pass
+    
+    async def close(self):
+        """Release LLM connections"""
+        await self.llm_client.close()
@@ -0,0 +1,48 @@
+"""
+Inbound message router - one listener, many responders
+"""
+
+class MessageRouter:
+    def __init__(self):
+        self.accounts = []
+        self.accounts_by_user_id = {}
+        self.listener = None
+
+    def set_accounts(self, active_accounts):
+        """Index managed accounts by Telegram user id"""
+        self.accounts = list(active_accounts)
+        self.accounts_by_user_id = {acc['user_id']: acc for acc in self.accounts}
+
+    def elect_listener(self, exclude=()):
+        """Pick the single account that receives group updates.
+
+        An already connected session wins, then the fastest-connecting one;
+        `exclude` lets the caller fail over away from listeners that dropped.
+        """
+        excluded = {acc['name'] for acc in exclude}
+        candidates = [
+            acc for acc in self.accounts
+            if acc['name'] not in excluded and acc.get('is_active', True)
+        ]
+        if not candidates:
+            self.listener = None
+            return None
+
+        self.listener = min(
+            candidates,
+            key=lambda acc: (acc.get('client') is None, acc.get('connect_time') or 0)
+        )
+        return self.listener
+
+    def is_managed(self, user_id):
+        return user_id in self.accounts_by_user_id
+
+    def get_account(self, user_id):
+        return self.accounts_by_user_id.get(user_id)
+
+    def route(self, sender_id):
+        """Accounts that may answer a message from sender_id"""
+        return [
+            acc for acc in self.accounts
+            if acc['user_id'] != sender_id and acc.get('is_active', True)
+        ]
@@ -57,10 +57,15 @@ class PersonalityManager:
     
     def assign_personalities(self, account_names):
         """Assign personalities based on account count"""
-        self.assigned_personalities = {}
+        self.assigned_personalities = self.make_assignments(account_names)
+        return self.assigned_personalities
+    
+    def make_assignments(self, account_names):
+        """Account name -> character key, without touching the current assignment"""
+        assignments = {}
         
         if not account_names:
-            return {}
+            return assignments
         
         num_accounts = len(account_names)
         
@@ -89,13 +94,22 @@ class PersonalityManager:
         for i, account_name in enumerate(account_names):
             if i < len(priority):
                 character_key = priority[i]
-                self.assigned_personalities[account_name] = character_key
+                assignments[account_name] = character_key
             else:
                 # Extra accounts get random
                 character_key = random.choice(list(self.six_characters.keys()))
-                self.assigned_personalities[account_name] = character_key
+                assignments[account_name] = character_key
         
-        return self.assigned_personalities
+        return assignments
+    
+    def build_user_index(self, accounts, assignments=None):
+        """Telegram user id -> character key for our own accounts"""
+        assignments = self.assigned_personalities if assignments is None else assignments
+        return {
+            acc['user_id']: assignments[acc['name']]
+            for acc in accounts
+            if acc.get('user_id') and acc['name'] in assignments
+        }
     
     def get_character_info(self, character_key):
         """Get full character details"""
@@ -125,20 +139,21 @@ Reply naturally (3-5 words max). Sound like a real {character['age']} year old:"
     def get_assigned_personalities(self):
         return self.assigned_personalities
     
-    def show_personality_assignment(self):
+    def show_personality_assignment(self, assignments=None, title="CHARACTER ASSIGNMENTS"):
         """Display character assignments"""
-        if not self.assigned_personalities:
+        assignments = self.assigned_personalities if assignments is None else assignments
+        if not assignments:
             print("🎭 No characters assigned yet")
             return
         
-        print("\n🎭 CHARACTER ASSIGNMENTS")
+        print(f"\n🎭 {title}")
         print("="*60)
-        for account, character_key in self.assigned_personalities.items():
+        for account, character_key in assignments.items():
             character = self.get_character_info(character_key)
             print(f"👤 {account:15} → {character['name']:15} (Age: {character['age']}, Role: {character['role'][:30]}...)")
         
         print("\n💬 GROUP DYNAMICS:")
-        chars = list(self.assigned_personalities.values())
+        chars = list(assignments.values())
         
         if "flirty_boy" in chars and "girl" in chars:
             print("   💕 Couple Dynamic: Flirty Boy ↔️ Girl (romantic tension)")
@@ -0,0 +1,34 @@
+"""
+Token bucket rate limiter
+"""
+import time
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate  # Tokens added per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def has_tokens(self, tokens=1):
+        self.refill()
+        return self.tokens >= tokens
+
+    def try_consume(self, tokens=1):
+        """Take tokens if available, never waits"""
+        if not self.has_tokens(tokens):
+            return False
+        self.tokens -= tokens
+        return True
+
+    def time_until(self, tokens=1):
+        """Seconds until `tokens` are available"""
+        self.refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
@@ -0,0 +1,135 @@
+"""
+Bounded reply pipeline - fixed workers, max queue size, max item age
+"""
+import asyncio
+import time
+from collections import deque
+from lanes import HUMAN, BOT, LANES, LANE_NAMES
+from config import REPLY_WORKERS, REPLY_QUEUE_SIZE, REPLY_MAX_AGE, BOT_LANE_MAX_SHARE
+
+class ReplyPipeline:
+    def __init__(self, handler, workers=REPLY_WORKERS, max_queue=REPLY_QUEUE_SIZE,
+                 max_age=REPLY_MAX_AGE, bot_share=BOT_LANE_MAX_SHARE, on_drop=None):
+        self.handler = handler
+        # Called with every job that is shed or goes stale without running
+        self.on_drop = on_drop
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_age = max_age
+
+        # lane -> deque of (enqueued_at, job), oldest first
+        self.lanes = {lane: deque() for lane in LANES}
+        self.busy = {lane: 0 for lane in LANES}
+        # Bot-to-bot chatter may only occupy part of the workers,
+        # the rest stays free for real group members
+        self.lane_limits = {
+            HUMAN: workers,
+            BOT: max(1, int(workers * bot_share))
+        }
+        self.worker_tasks = []
+
+        # Created in start() so it binds to the running loop
+        self.wakeup = None
+
+        self.stats = {
+            'submitted': 0,
+            'processed': 0,
+            'dropped_stale': 0,
+            'dropped_overflow': 0,
+            'errors': 0,
+            'max_depth': 0
+        }
+        self.lane_stats = {lane: {'submitted': 0, 'processed': 0} for lane in LANES}
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        for lane in LANES:
+            self.lanes[lane].clear()
+            self.busy[lane] = 0
+        self.worker_tasks = [asyncio.create_task(self.worker_loop()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        self.worker_tasks = []
+        for lane in LANES:
+            self.lanes[lane].clear()
+
+    def depth(self):
+        return sum(len(queue) for queue in self.lanes.values())
+
+    def submit(self, job, lane):
+        """Queue a job, returns False if it was shed.
+
+        When the queue is full the oldest job of the lowest-priority
+        non-empty lane goes - unless that lane matters more than the newcomer.
+        """
+        self.stats['submitted'] += 1
+        self.lane_stats[lane]['submitted'] += 1
+
+        if self.depth() >= self.max_queue:
+            victim_lane = max(l for l in LANES if self.lanes[l])
+            self.stats['dropped_overflow'] += 1
+            if victim_lane < lane:
+                self.dropped(job)
+                return False
+            self.dropped(self.lanes[victim_lane].popleft()[1])
+
+        self.lanes[lane].append((time.monotonic(), job))
+        self.stats['max_depth'] = max(self.stats['max_depth'], self.depth())
+        self.wakeup.set()
+        return True
+
+    def dropped(self, job):
+        if self.on_drop:
+            self.on_drop(job)
+
+    def take_next(self):
+        """Highest-priority job whose lane still has a free worker slot"""
+        for lane in LANES:
+            if self.lanes[lane] and self.busy[lane] < self.lane_limits[lane]:
+                return lane, self.lanes[lane].popleft()
+        return None, None
+
+    async def worker_loop(self):
+        while True:
+            lane, item = self.take_next()
+            if item is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            enqueued_at, job = item
+
+            # Nobody cares about a reply to a message from minutes ago
+            if time.monotonic() - enqueued_at > self.max_age:
+                self.stats['dropped_stale'] += 1
+                self.dropped(job)
+                continue
+
+            self.busy[lane] += 1
+            try:
+                await self.handler(job)
+                self.stats['processed'] += 1
+                self.lane_stats[lane]['processed'] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"❌ Reply worker error: {e}")
+            finally:
+                self.busy[lane] -= 1
+                # A lane slot opened up
+                self.wakeup.set()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['depth'] = self.depth()
+        for lane in LANES:
+            name = LANE_NAMES[lane]
+            stats[f'{name}_depth'] = len(self.lanes[lane])
+            stats[f'{name}_busy'] = self.busy[lane]
+            stats[f'{name}_submitted'] = self.lane_stats[lane]['submitted']
+            stats[f'{name}_processed'] = self.lane_stats[lane]['processed']
+        return stats
@@ -0,0 +1,95 @@
+"""
+Turn-taking reply scheduler - picks who answers a message
+"""
+import random
+import time
+from message_handler import CHARACTER_RELATIONSHIPS
+from lanes import BOT
+from config import MAX_RESPONDERS_PER_MESSAGE, GROUP_REPLIES_PER_MINUTE, GROUP_BOT_REPLIES_PER_MINUTE
+
+# Characters that talk business with each other
+HUSTLERS = {"hustler_1", "hustler_2"}
+
+class ReplyScheduler:
+    def __init__(self):
+        self.max_responders = MAX_RESPONDERS_PER_MESSAGE
+        self.replies_per_minute = GROUP_REPLIES_PER_MINUTE
+        self.bot_replies_per_minute = GROUP_BOT_REPLIES_PER_MINUTE
+
+    def affinity(self, character_key, sender_character):
+        """How naturally a character answers the sender"""
+        if (character_key, sender_character) in CHARACTER_RELATIONSHIPS:
+            return 3.0
+        if character_key in HUSTLERS and (sender_character in HUSTLERS or sender_character == "hustler"):
+            return 2.0
+        return 1.0
+
+    @staticmethod
+    def prune(window, cutoff):
+        while window and window[0] < cutoff:
+            window.popleft()
+        return len(window)
+
+    def remaining_budget(self, group, lane):
+        """Replies still allowed in the group's current minute.
+
+        Every reply counts against the group budget, bot-lane replies
+        also against their own smaller one.
+        """
+        cutoff = time.monotonic() - 60
+        remaining = self.replies_per_minute - self.prune(group.reply_times, cutoff)
+        if lane == BOT:
+            remaining = min(remaining, self.bot_replies_per_minute - self.prune(group.bot_reply_times, cutoff))
+        return max(0, remaining)
+
+    def pick_responders(self, group, sender_character, candidates, lane):
+        """Choose at most MAX_RESPONDERS_PER_MESSAGE accounts and reserve their budget.
+
+        Returns (responders, reservation). The slots are taken right away so
+        a burst of messages can't all see the same free budget; hand the
+        reservation to release() for every reply that never goes out.
+        """
+        slots = min(self.max_responders, self.remaining_budget(group, lane), len(candidates))
+        if slots <= 0:
+            return [], None
+
+        recent = group.recent_speakers
+
+        scored = []
+        for client_data in candidates:
+            score = self.affinity(group.get_character_key(client_data['name']), sender_character)
+
+            # Turn-taking: whoever spoke recently waits their turn
+            if client_data['name'] in recent:
+                score *= 0.3
+
+            # Jitter keeps the conversation from becoming predictable
+            scored.append((score * random.uniform(0.7, 1.3), client_data))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        chosen = [client_data for _, client_data in scored[:slots]]
+
+        reservation = (lane, time.monotonic())
+        for window in self.budget_windows(group, lane):
+            window.extend([reservation[1]] * len(chosen))
+        return chosen, reservation
+
+    @staticmethod
+    def budget_windows(group, lane):
+        if lane == BOT:
+            return (group.reply_times, group.bot_reply_times)
+        return (group.reply_times,)
+
+    def release(self, group, reservation):
+        """Give back one reply slot that was reserved but not used"""
+        lane, reserved_at = reservation
+        for window in self.budget_windows(group, lane):
+            # Already aged out of the window if it isn't there
+            try:
+                window.remove(reserved_at)
+            except ValueError:
+                pass
+
+    def record_turn(self, group, account_name):
+        """Remember who just spoke in the group"""
+        group.recent_speakers.append(account_name)
@@ -0,0 +1,87 @@
+"""
+LRU + TTL cache of LLM replies for repeated short messages
+"""
+import random
+import re
+import time
+from collections import OrderedDict
+from config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_CANDIDATES
+
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL,
+                 candidates_per_key=RESPONSE_CACHE_CANDIDATES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.candidates_per_key = candidates_per_key
+
+        # key -> list of (added_at, response), least recently used first
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(message):
+        """'Hey guys!!' and 'hey  guys' share a key"""
+        return ' '.join(re.sub(r'[^a-z0-9\s]', '', message.lower()).split())
+
+    def make_key(self, character_key, sender_character, message):
+        return (character_key, sender_character, self.normalize(message))
+
+    def _live_candidates(self, key):
+        """Drop expired candidates, return what is left"""
+        candidates = self.entries.get(key)
+        if candidates is None:
+            return []
+
+        cutoff = time.monotonic() - self.ttl
+        live = [item for item in candidates if item[0] >= cutoff]
+
+        if not live:
+            del self.entries[key]
+        elif len(live) != len(candidates):
+            self.entries[key] = live
+        return live
+
+    def lookup(self, key, is_valid):
+        """Return a cached reply that passes is_valid, or None.
+
+        Only warm keys (a full set of candidates) are served, so the same
+        phrase doesn't keep coming back while variety is still being built up.
+        """
+        candidates = self._live_candidates(key)
+
+        if len(candidates) >= self.candidates_per_key:
+            self.entries.move_to_end(key)
+            for _, response in random.sample(candidates, len(candidates)):
+                if is_valid(response):
+                    self.hits += 1
+                    return response
+
+        self.misses += 1
+        return None
+
+    def add(self, key, response):
+        """Store a validated reply under key"""
+        candidates = self._live_candidates(key)
+        if any(existing == response for _, existing in candidates):
+            return
+
+        candidates.append((time.monotonic(), response))
+        # Keep the newest candidates only
+        self.entries[key] = candidates[-self.candidates_per_key:]
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
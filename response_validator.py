@@ -0,0 +1,125 @@
+"""
+Reply cleaning and validation - precompiled patterns, one tokenize per candidate
+"""
+import re
+
+# Replies are cut to this many words
+REPLY_WORD_LIMIT = 5
+# Shorter replies are rejected
+REPLY_MIN_WORDS = 2
+
+FORMAL_WORDS = ('indeed', 'perhaps', 'absolutely', 'marvelous', 'wonderful')
+PROMPT_LEAKS = ('rule', 'example')
+BAD_ENDINGS = ('the', 'a', 'to', 'of', 'in', 'and', 'or')
+
+NON_ASCII = re.compile(r'[^\x00-\x7F]+')
+HASHTAG = re.compile(r'#\w+')
+# Formal words and prompt leaks, matched anywhere like a substring check
+BANNED = re.compile('|'.join(re.escape(word) for word in FORMAL_WORDS + PROMPT_LEAKS))
+
+class ResponseValidator:
+    def __init__(self, word_limit=REPLY_WORD_LIMIT):
+        self.word_limit = word_limit
+
+    @staticmethod
+    def has_banned(lower):
+        """True if lowercased text has a formal word or a prompt leak"""
+        return BANNED.search(lower) is not None
+
+    def clean(self, text):
+        """Strip emojis and hashtags, cut to the word limit, drop dangling endings"""
+        if not text:
+            return ""
+
+        text = HASHTAG.sub('', NON_ASCII.sub('', text))
+        words = text.strip('"\'`').split()[:self.word_limit]
+
+        if words:
+            words[-1] = words[-1].rstrip(',')
+            if not words[-1]:
+                words.pop()
+
+        # One pass in order, so "go to the" loses "the" and then "to"
+        for ending in BAD_ENDINGS:
+            if len(words) > 1 and words[-1].lower() == ending:
+                words.pop()
+
+        return ' '.join(words)
+
+    def check(self, response, original_words, recent=()):
+        """Lowercased word set of a valid response, or None if it is rejected"""
+        if not response or len(response.strip()) < 2:
+            return None
+
+        lower = response.lower()
+        words = lower.split()
+        if len(words) < REPLY_MIN_WORDS or len(words) > self.word_limit:
+            return None
+
+        if self.has_banned(lower):
+            return None
+
+        # No copying
+        word_set = frozenset(words)
+        if len(original_words & word_set) >= 2:
+            return None
+
+        # No repetition
+        if lower in recent[-2:]:
+            return None
+
+        return word_set
+
+    def is_valid(self, response, original_message, recent=()):
+        original_words = frozenset(original_message.lower().split())
+        return self.check(response, original_words, recent) is not None
+
+    def rank(self, candidates, original_message, recent=()):
+        """Valid candidates, best first.
+
+        Fewer words shared with the message and with `recent` replies
+        score higher, and 3+ word replies beat two-word ones.
+        """
+        original_words = frozenset(original_message.lower().split())
+        recent_words = [frozenset(reply.split()) for reply in recent]
+
+        scored = []
+        seen = set()
+        for index, candidate in enumerate(candidates):
+            word_set = self.check(candidate, original_words, recent)
+            if word_set is None or candidate.lower() in seen:
+                continue
+            seen.add(candidate.lower())
+
+            echo = max((len(word_set & words) / len(word_set | words) for words in recent_words), default=0.0)
+            score = 1.0 - 0.25 * len(original_words & word_set) - 0.5 * echo
+            if len(word_set) >= 3:
+                score += 0.1
+            # Earlier candidates win ties
+            scored.append((-score, index, candidate))
+
+        scored.sort()
+        return [candidate for _, _, candidate in scored]
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: per-candidate cost of clean + rank
+    import timeit
+
+    validator = ResponseValidator()
+    raw = [
+        '"haha thats sweet 😊"', 'maybe later bro #busy', 'indeed a wonderful idea',
+        'you look nice today and', 'listen bro trust me', 'busy rn', 'how does that work',
+        'thinking of you, always', 'the rules say hello', 'wanna hang out later'
+    ]
+    message = "hey guys whats up today"
+    recent = ['busy rn', 'haha thanks']
+
+    def run():
+        validator.rank([validator.clean(text) for text in raw], message, recent)
+
+    loops = 10000
+    seconds = min(timeit.repeat(run, number=loops, repeat=5))
+    print(f"{len(raw)} candidates: {seconds / loops * 1e6:.1f} us per batch, "
+          f"{seconds / (loops * len(raw)) * 1e6:.2f} us per candidate")
+    print("ranked:", validator.rank([validator.clean(text) for text in raw], message, recent))
@@ -0,0 +1,145 @@
+"""
+Per-account send queues with rate limiting and FloodWait handling
+"""
+import asyncio
+import time
+from collections import deque
+from telethon.errors import FloodWaitError
+from rate_limit import TokenBucket
+from config import SEND_RATE_PER_MINUTE, SEND_BURST, SEND_MAX_RETRIES, SEND_RETRY_DELAY, SEND_MAX_AGE
+
+class AccountSender:
+    """FIFO outbox for one account. A message that fails stays at the head
+    of the queue until it is sent, so order is kept across retries.
+    Messages still waiting after SEND_MAX_AGE are dropped - a reply that
+    sat out a long FloodWait no longer fits the conversation."""
+
+    def __init__(self, client_data, lease):
+        self.client_data = client_data
+        self.lease = lease
+        self.name = client_data['name']
+        self.bucket = TokenBucket(SEND_RATE_PER_MINUTE / 60, SEND_BURST)
+        self.outbox = deque()  # [chat_id, text, future, attempts, enqueued_at]
+        self.paused_until = 0.0
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+        self.stats = {'sent': 0, 'flood_waits': 0, 'retries': 0, 'failed': 0, 'expired': 0}
+
+    def is_paused(self):
+        return time.monotonic() < self.paused_until
+
+    def enqueue(self, chat_id, text):
+        future = asyncio.get_running_loop().create_future()
+        self.outbox.append([chat_id, text, future, 0, time.monotonic()])
+        self.wakeup.set()
+        return future
+
+    async def run(self):
+        while True:
+            if not self.outbox:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            if self.drop_expired():
+                continue
+
+            # FloodWait pause, then the token bucket - waking up early
+            # if the next message expires before then
+            wait = max(self.paused_until - time.monotonic(), self.bucket.time_until())
+            if wait > 0:
+                expires_in = self.outbox[0][4] + SEND_MAX_AGE - time.monotonic()
+                await asyncio.sleep(min(wait, max(expires_in, 0)))
+                continue
+
+            item = self.outbox[0]
+            chat_id, text, future, attempts, _ = item
+            self.bucket.try_consume()
+
+            try:
+                async with self.lease(self.client_data) as client:
+                    message = await client.send_message(chat_id, text)
+            except FloodWaitError as e:
+                # Only this account waits, the message stays first in line
+                self.paused_until = time.monotonic() + e.seconds
+                self.stats['flood_waits'] += 1
+                print(f"⏳ {self.name} hit FloodWait, pausing {e.seconds}s")
+                continue
+            except Exception as e:
+                item[3] = attempts + 1
+                if item[3] >= SEND_MAX_RETRIES:
+                    self.outbox.popleft()
+                    self.stats['failed'] += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(SEND_RETRY_DELAY * item[3])
+                continue
+
+            self.outbox.popleft()
+            self.stats['sent'] += 1
+            if not future.done():
+                future.set_result(message)
+
+    def drop_expired(self):
+        """Drop messages that waited longer than SEND_MAX_AGE, True if any went"""
+        cutoff = time.monotonic() - SEND_MAX_AGE
+        dropped = False
+        while self.outbox and self.outbox[0][4] < cutoff:
+            _, _, future, _, _ = self.outbox.popleft()
+            self.stats['expired'] += 1
+            dropped = True
+            if not future.done():
+                future.set_exception(asyncio.TimeoutError(f"not sent within {SEND_MAX_AGE}s"))
+        return dropped
+
+    async def stop(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        for _, _, future, _, _ in self.outbox:
+            if not future.done():
+                future.cancel()
+        self.outbox.clear()
+
+
+class SendManager:
+    def __init__(self, lease):
+        # lease(client_data) -> async context manager yielding a connected client
+        self.lease = lease
+        self.senders = {}
+
+    def get_sender(self, client_data):
+        sender = self.senders.get(client_data['name'])
+        if sender is None or sender.client_data is not client_data:
+            if sender is not None:
+                sender.task.cancel()
+            sender = AccountSender(client_data, self.lease)
+            self.senders[client_data['name']] = sender
+        return sender
+
+    def submit(self, client_data, chat_id, text):
+        """Queue a message, returns a future that resolves once it is sent"""
+        return self.get_sender(client_data).enqueue(chat_id, text)
+
+    async def send(self, client_data, chat_id, text):
+        """Queue a message and wait until it is actually sent"""
+        return await self.submit(client_data, chat_id, text)
+
+    def is_paused(self, account_name):
+        sender = self.senders.get(account_name)
+        return sender is not None and sender.is_paused()
+
+    async def stop(self):
+        await asyncio.gather(*(sender.stop() for sender in self.senders.values()))
+        self.senders = {}
+
+    def get_stats(self):
+        totals = {'sent': 0, 'flood_waits': 0, 'retries': 0, 'failed': 0, 'expired': 0, 'queued': 0, 'paused': 0}
+        for sender in self.senders.values():
+            for key, value in sender.stats.items():
+                totals[key] += value
+            totals['queued'] += len(sender.outbox)
+            totals['paused'] += sender.is_paused()
+        return totals
@@ -0,0 +1,446 @@
+"""
+Sharded run mode - Telegram clients spread over worker processes
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from contextlib import asynccontextmanager
+from telethon import events
+from telethon.errors import FloodWaitError
+from account_manager import AccountManager, AccountUnauthorized
+from config import SHARD_WORKERS, SHARD_SOCKET, SHARD_START_TIMEOUT, CLIENT_IDLE_TIMEOUT
+
+class ShardConnection:
+    """JSON lines over a local socket.
+
+    A message with an 'id' is a request and gets a 'reply' carrying the
+    same id; everything else is handed to on_message.
+    """
+
+    def __init__(self, reader, writer, on_message):
+        self.reader = reader
+        self.writer = writer
+        self.on_message = on_message
+        self.pending = {}
+        self.next_id = 0
+        self.closed = False
+        self.tasks = set()
+        self.read_task = None
+
+    def start(self):
+        self.read_task = asyncio.create_task(self.read_loop())
+
+    def notify(self, op, **fields):
+        """Send without waiting for an answer"""
+        if self.closed:
+            raise ConnectionError("shard connection closed")
+        self.writer.write(json.dumps({'op': op, **fields}).encode() + b"\n")
+
+    async def request(self, op, **fields):
+        self.next_id += 1
+        request_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            self.notify(op, id=request_id, **fields)
+            await self.writer.drain()
+            return await future
+        finally:
+            self.pending.pop(request_id, None)
+
+    def reply(self, request_id, **fields):
+        self.notify('reply', id=request_id, **fields)
+
+    async def read_loop(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+
+                if message['op'] == 'reply':
+                    future = self.pending.get(message['id'])
+                    if future and not future.done():
+                        future.set_result(message)
+                    continue
+
+                # Sends can take seconds, don't hold up the socket
+                task = asyncio.create_task(self.on_message(message))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("shard connection closed"))
+
+    async def close(self):
+        self.closed = True
+        if self.read_task:
+            self.read_task.cancel()
+            await asyncio.gather(self.read_task, return_exceptions=True)
+        for task in list(self.tasks):
+            task.cancel()
+        self.writer.close()
+
+
+def check_reply(reply):
+    """Raise the worker-side error of a reply, FloodWait and revoked
+    sessions keep their type"""
+    if reply.get('error') == 'flood_wait':
+        raise FloodWaitError(request=None, capture=reply['seconds'])
+    if reply.get('error') == 'unauthorized':
+        raise AccountUnauthorized(reply['message'])
+    if reply.get('error'):
+        raise RuntimeError(reply['error'])
+    return reply
+
+
+class ShardWorker:
+    """Runs in a worker process and owns one slice of the Telegram clients"""
+
+    def __init__(self, shard, names, socket_path):
+        self.shard = shard
+        self.names = names
+        self.socket_path = socket_path
+        self.account_manager = None
+        self.clients = {}
+        self.connection = None
+        self.stopped = None
+
+    async def run(self):
+        # Only this shard's accounts, and no migration or writes - the
+        # coordinator's process owns the store
+        self.account_manager = AccountManager(self.names, read_only=True)
+        self.stopped = asyncio.Event()
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        self.connection = ShardConnection(reader, writer, self.handle)
+        self.connection.notify('hello', shard=self.shard)
+        self.connection.start()
+
+        eviction_task = None
+        if CLIENT_IDLE_TIMEOUT:
+            eviction_task = asyncio.create_task(self.account_manager.idle_eviction_loop())
+
+        # Until the coordinator says stop or goes away
+        stop_task = asyncio.create_task(self.stopped.wait())
+        await asyncio.wait([stop_task, self.connection.read_task], return_when=asyncio.FIRST_COMPLETED)
+        stop_task.cancel()
+
+        if eviction_task:
+            eviction_task.cancel()
+        await self.account_manager.disconnect_all()
+        await self.connection.close()
+
+    async def handle(self, message):
+        request_id = message.pop('id', None)
+        op = message.pop('op')
+
+        try:
+            result = await getattr(self, f"op_{op}")(**message)
+        except FloodWaitError as e:
+            result = {'error': 'flood_wait', 'seconds': e.seconds}
+        except AccountUnauthorized as e:
+            result = {'error': 'unauthorized', 'message': str(e)}
+        except Exception as e:
+            result = {'error': str(e) or type(e).__name__}
+
+        if request_id is not None and not self.connection.closed:
+            self.connection.reply(request_id, **(result or {}))
+
+    async def op_init(self):
+        clients = await self.account_manager.initialize_accounts(self.names)
+        self.clients = {client_data['name']: client_data for client_data in clients}
+        return {
+            'accounts': [
+                {key: client_data[key] for key in ('name', 'user_id', 'phone', 'username', 'connect_time')}
+                for client_data in clients
+            ],
+            'failed': self.account_manager.failed_accounts
+        }
+
+    async def op_connect(self, name):
+        client_data = self.clients[name]
+        await self.account_manager.get_client(client_data)
+        return {'connect_time': client_data['connect_time']}
+
+    async def op_pin(self, name):
+        self.account_manager.pin(self.clients[name])
+
+    async def op_listen(self, name, chats):
+        client_data = self.clients[name]
+        client = await self.account_manager.get_client(client_data)
+
+        @client.on(events.NewMessage(chats=chats))
+        async def forward(event):
+            self.connection.notify(
+                'message',
+                name=name,
+                chat_id=event.chat_id,
+                sender_id=event.sender_id,
+                message_id=event.message.id,
+                text=event.message.text
+            )
+
+    async def op_send(self, name, chat_id, text):
+        async with self.account_manager.lease(self.clients[name]) as client:
+            message = await client.send_message(chat_id, text)
+        return {'message_id': message.id}
+
+    async def op_stats(self):
+        return self.account_manager.get_pool_stats()
+
+    async def op_stop(self):
+        self.stopped.set()
+
+
+def run_worker(shard, names, socket_path):
+    """Worker process entry point"""
+    try:
+        asyncio.run(ShardWorker(shard, names, socket_path).run())
+    except KeyboardInterrupt:
+        pass
+
+
+class RemoteMessage:
+    def __init__(self, message_id, text):
+        self.id = message_id
+        self.text = text
+
+
+class RemoteEvent:
+    """The parts of a NewMessage event the controller reads"""
+
+    def __init__(self, message):
+        self.chat_id = message['chat_id']
+        self.sender_id = message['sender_id']
+        self.message = RemoteMessage(message['message_id'], message['text'])
+
+
+class RemoteClient:
+    """Stand-in for a TelegramClient living in a worker process"""
+
+    def __init__(self, coordinator, connection, name):
+        self.coordinator = coordinator
+        self.connection = connection
+        self.name = name
+        self.listening = None
+
+    def is_connected(self):
+        return not self.connection.closed
+
+    def on(self, event):
+        """Register a handler; the worker confirms in the background, await
+        `listening` (ShardCoordinator.wait_listening) to know it took"""
+        def decorator(callback):
+            self.coordinator.handlers.setdefault(self.name, []).append(callback)
+            self.listening = asyncio.create_task(self.listen(event.chats))
+            return callback
+        return decorator
+
+    async def listen(self, chats):
+        check_reply(await self.connection.request('listen', name=self.name, chats=chats))
+
+    async def send_message(self, chat_id, text):
+        reply = check_reply(await self.connection.request('send', name=self.name, chat_id=chat_id, text=text))
+        return RemoteMessage(reply['message_id'], text)
+
+
+class ShardCoordinator:
+    """Takes the account manager's place in BotController when sharding.
+
+    Worker processes hold the Telegram clients (MTProto crypto, updates,
+    sends); reply scheduling, dedupe, LLM calls, history and logging stay
+    in this process.
+    """
+
+    def __init__(self, account_manager, workers=SHARD_WORKERS, socket_path=SHARD_SOCKET):
+        self.account_manager = account_manager
+        self.workers = workers
+        self.socket_path = socket_path
+
+        self.server = None
+        self.processes = []
+        self.connections = []
+        self.handlers = {}  # account name -> inbound message callbacks
+        self.shard_stats = {}
+
+        self.active_accounts = []
+        self.failed_accounts = []
+
+    @property
+    def accounts(self):
+        return self.account_manager.accounts
+
+    async def initialize_accounts(self):
+        """Start the workers and let each one bring up its accounts"""
+        self.active_accounts = []
+        self.failed_accounts = []
+
+        names = [acc['name'] for acc in self.accounts if acc.get('is_active', True)]
+        if not names:
+            return self.active_accounts
+
+        shards = max(1, min(self.workers, len(names)))
+        started = time.perf_counter()
+        await self.start_workers([names[shard::shards] for shard in range(shards)])
+
+        replies = await asyncio.gather(
+            *(connection.request('init') for connection in self.connections),
+            return_exceptions=True
+        )
+
+        clients = {}
+        for shard, (connection, reply) in enumerate(zip(self.connections, replies)):
+            if isinstance(reply, Exception):
+                print(f"❌ Shard {shard} failed to start its accounts: {reply}")
+                continue
+            for account in reply['accounts']:
+                self.save_user_id(account)
+                account['client'] = RemoteClient(self, connection, account['name'])
+                account['shard'] = shard
+                clients[account['name']] = account
+            self.failed_accounts.extend(reply['failed'])
+
+        # Keep the configured account order
+        self.active_accounts = [clients[name] for name in names if name in clients]
+
+        print(f"🧩 {len(self.active_accounts)} accounts on {shards} worker processes "
+              f"({time.perf_counter() - started:.1f}s)")
+        if self.failed_accounts:
+            print(f"⚠️  {len(self.failed_accounts)} account(s) failed to start")
+        return self.active_accounts
+
+    def save_user_id(self, account):
+        """Workers open the store read-only, so new user ids are saved here"""
+        known = self.account_manager.get_account(account['name'])
+        if known and account['user_id'] and known.get('user_id') != account['user_id']:
+            self.account_manager.store.update(account['name'], user_id=account['user_id'])
+            known['user_id'] = account['user_id']
+
+    async def start_workers(self, slices):
+        connected = {}
+        all_connected = asyncio.Event()
+
+        async def on_connect(reader, writer):
+            hello = json.loads(await reader.readline())
+            connection = ShardConnection(reader, writer, self.handle_message)
+            connection.start()
+            connected[hello['shard']] = connection
+            if len(connected) == len(slices):
+                all_connected.set()
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.server = await asyncio.start_unix_server(on_connect, path=self.socket_path)
+
+        # spawn: a fresh interpreter per worker, nothing inherited from this loop
+        context = multiprocessing.get_context('spawn')
+        for shard, names in enumerate(slices):
+            process = context.Process(
+                target=run_worker,
+                args=(shard, names, self.socket_path),
+                name=f"shard-{shard}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+
+        await asyncio.wait_for(all_connected.wait(), SHARD_START_TIMEOUT)
+        self.connections = [connected[shard] for shard in range(len(slices))]
+
+    async def handle_message(self, message):
+        if message['op'] != 'message':
+            return
+
+        event = RemoteEvent(message)
+        for callback in self.handlers.get(message['name'], []):
+            await callback(event)
+
+    def get_connection(self, client_data):
+        return self.connections[client_data['shard']]
+
+    async def get_client(self, client_data):
+        """Make the owning worker connect the account"""
+        try:
+            reply = check_reply(await self.get_connection(client_data).request('connect', name=client_data['name']))
+        except AccountUnauthorized:
+            self.deactivate(client_data)
+            raise
+        client_data['connect_time'] = reply['connect_time']
+        return client_data['client']
+
+    @asynccontextmanager
+    async def lease(self, client_data):
+        # The worker leases its real client for the duration of each send
+        try:
+            yield client_data['client']
+        except AccountUnauthorized:
+            self.deactivate(client_data)
+            raise
+
+    def deactivate(self, client_data):
+        """The worker found the session revoked - the store is written here"""
+        client_data['is_active'] = False
+        self.account_manager.toggle_account_status(client_data['name'], False)
+
+    def pin(self, client_data):
+        self.get_connection(client_data).notify('pin', name=client_data['name'])
+
+    async def wait_listening(self, client_data):
+        """Wait until the owning worker has registered the inbound handler"""
+        listening = client_data['client'].listening
+        if listening:
+            await listening
+
+    async def idle_eviction_loop(self):
+        """Workers evict their own idle clients, this collects their pool numbers"""
+        while True:
+            await asyncio.sleep(max(5, CLIENT_IDLE_TIMEOUT / 4))
+            await self.refresh_pool_stats()
+
+    async def refresh_pool_stats(self):
+        for shard, connection in enumerate(self.connections):
+            try:
+                self.shard_stats[shard] = check_reply(await connection.request('stats'))
+            except Exception:
+                self.shard_stats.pop(shard, None)
+
+    def get_pool_stats(self):
+        totals = {'accounts': len(self.active_accounts), 'connected': 0, 'connects': 0, 'evictions': 0, 'overshoots': 0}
+        for stats in self.shard_stats.values():
+            for key in ('connected', 'connects', 'evictions', 'overshoots'):
+                totals[key] += stats.get(key, 0)
+        totals['workers'] = sum(1 for connection in self.connections if not connection.closed)
+        return totals
+
+    async def disconnect_all(self):
+        """Stop the workers, they disconnect their own clients"""
+        for connection in self.connections:
+            try:
+                await asyncio.wait_for(connection.request('stop'), 10)
+            except Exception:
+                pass
+            await connection.close()
+
+        for process in self.processes:
+            await asyncio.to_thread(process.join, 10)
+            if process.is_alive():
+                process.terminate()
+
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        stopped = len(self.processes)
+        self.server = None
+        self.processes = []
+        self.connections = []
+        self.shard_stats = {}
+        if stopped:
+            print(f"🔌 Stopped {stopped} worker processes")
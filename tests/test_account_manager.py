@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+import account_manager
+from account_manager import AccountManager, AccountUnauthorized
+from account_store import AccountStore
+from message_router import MessageRouter
+
+
+class FakeClient:
+    """TelegramClient stand-in for the pool's reconnect path"""
+    authorized = True
+    instances = []
+
+    def __init__(self, session, api_id, api_hash):
+        self.session = session
+        self.connected = False
+        self.dialog_loads = 0
+        FakeClient.instances.append(self)
+
+    async def connect(self):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    def is_connected(self):
+        return self.connected
+
+    async def is_user_authorized(self):
+        return FakeClient.authorized
+
+    async def get_dialogs(self, limit):
+        self.dialog_loads += 1
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(account_manager, 'TelegramClient', FakeClient)
+    monkeypatch.setattr(account_manager, 'CLIENT_LAZY_CONNECT', True)
+    monkeypatch.setattr(account_manager, 'CLIENT_POOL_MAX_CONNECTED', 1)
+    FakeClient.authorized = True
+    FakeClient.instances = []
+
+    store = AccountStore()
+    for user_id, name in enumerate(('alice', 'bob'), 1):
+        store.add({'name': name, 'api_id': 1, 'api_hash': 'x', 'phone': '', 'user_id': user_id,
+                   'username': '', 'first_name': '', 'session_string': ''})
+    store.close()
+
+    manager = AccountManager()
+    asyncio.run(manager.initialize_accounts())
+    return manager
+
+
+def test_dialogs_load_once_per_session(manager):
+    alice, bob = manager.active_accounts
+
+    async def scenario():
+        await manager.get_client(alice)
+        # bob needs alice's slot, then alice comes back
+        await manager.get_client(bob)
+        await manager.get_client(alice)
+
+    asyncio.run(scenario())
+
+    first, _, again = FakeClient.instances
+    assert manager.evictions == 2
+    assert again.session is first.session
+    assert first.dialog_loads + again.dialog_loads == 1
+
+
+def test_overshoot_is_counted_when_nothing_is_idle(manager):
+    alice, bob = manager.active_accounts
+
+    async def scenario():
+        await manager.get_client(alice)
+        manager.pin(alice)
+        await manager.get_client(bob)
+
+    asyncio.run(scenario())
+
+    stats = manager.get_pool_stats()
+    assert stats['connected'] == 2
+    assert stats['overshoots'] == 1
+    assert stats['evictions'] == 0
+
+
+def test_revoked_session_disables_the_account(manager):
+    alice, bob = manager.active_accounts
+    FakeClient.authorized = False
+    router = MessageRouter()
+    router.set_accounts(manager.active_accounts)
+
+    with pytest.raises(AccountUnauthorized):
+        asyncio.run(manager.get_client(alice))
+
+    assert alice['client'] is None
+    assert AccountStore().get('alice')['is_active'] is False
+    assert router.route(sender_id=99) == [bob]
+    assert router.elect_listener() is bob
@@ -0,0 +1,144 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import chat_logger
+from chat_logger import ChatLogger, INDEX_RECORD
+
+START = datetime(2026, 1, 1, 10, 0, 0)
+
+
+class FakeDatetime(datetime):
+    """datetime whose now() replays a list of clock readings"""
+    readings = []
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.readings.pop(0)
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(chat_logger, 'datetime', FakeDatetime)
+    FakeDatetime.readings = []
+    return FakeDatetime.readings
+
+
+def at(seconds):
+    return (START + timedelta(seconds=seconds)).isoformat()
+
+
+def write_entries(clock, entries):
+    """entries: (seconds after START, account, message, group id)"""
+    logger = ChatLogger()
+    for seconds, account, message, group_id in entries:
+        clock.append(START + timedelta(seconds=seconds))
+        logger.log_message(account, message, "Girl", group_id)
+    logger.close()
+
+
+def messages(entries):
+    return [entry['message'] for entry in entries]
+
+
+ENTRIES = [
+    (0, 'alice', 'one', -1),
+    (10, 'bob', 'two', -2),
+    (20, 'alice', 'three', -1),
+    (30, 'bob', 'four', -1),
+]
+
+
+def test_round_trip_log_reopen_and_query(log_dir, clock):
+    write_entries(clock, ENTRIES)
+
+    logger = ChatLogger()
+    try:
+        assert messages(logger.get_logs()) == ['one', 'two', 'three', 'four']
+        assert messages(logger.get_logs(limit=2)) == ['three', 'four']
+        assert messages(logger.get_logs(since=at(10), until=at(20))) == ['two', 'three']
+        assert messages(logger.get_logs(account='alice')) == ['one', 'three']
+        assert messages(logger.get_logs(group_id=-1, since=at(5))) == ['three', 'four']
+        assert messages(logger.iter_range(reverse=True)) == ['four', 'three', 'two', 'one']
+    finally:
+        logger.close()
+
+
+def test_index_is_rebuilt_when_missing(log_dir, clock):
+    write_entries(clock, ENTRIES)
+    os.remove('chat_logs.idx')
+
+    logger = ChatLogger()
+    try:
+        assert os.path.getsize('chat_logs.idx') == INDEX_RECORD.size * len(ENTRIES)
+        assert messages(logger.get_logs(since=at(15))) == ['three', 'four']
+    finally:
+        logger.close()
+
+
+def test_recovers_from_a_truncated_write(log_dir, clock):
+    write_entries(clock, ENTRIES)
+
+    # Crash mid-write: half a log line and a torn index record
+    with open('chat_logs.jsonl', 'ab') as f:
+        f.write(b'{"timestamp": "2026-01-01T10:00:40", "acc')
+    with open('chat_logs.idx', 'ab') as f:
+        f.write(b'\x00' * (INDEX_RECORD.size // 2))
+
+    logger = ChatLogger()
+    try:
+        assert os.path.getsize('chat_logs.idx') == INDEX_RECORD.size * len(ENTRIES)
+        clock.append(START + timedelta(seconds=50))
+        logger.log_message('carol', 'five', "Girl", -1)
+        assert messages(logger.get_logs(since=at(25))) == ['four', 'five']
+        # The torn bytes are gone, so the log reads line by line again
+        assert messages(logger.iter_logs()) == ['one', 'two', 'three', 'four', 'five']
+    finally:
+        logger.close()
+
+
+def test_index_is_rebuilt_after_losing_its_tail(log_dir, clock):
+    write_entries(clock, ENTRIES)
+    with open('chat_logs.idx', 'r+b') as f:
+        f.truncate(INDEX_RECORD.size)
+
+    logger = ChatLogger()
+    try:
+        assert messages(logger.get_logs(since=at(10))) == ['two', 'three', 'four']
+    finally:
+        logger.close()
+
+
+def test_clock_going_backwards_loses_no_rows(log_dir, clock):
+    # The wall clock steps back 7 seconds before the third entry
+    write_entries(clock, [
+        (0, 'alice', 'one', -1),
+        (10, 'bob', 'two', -1),
+        (3, 'alice', 'three', -1),
+        (12, 'bob', 'four', -1),
+    ])
+
+    logger = ChatLogger()
+    try:
+        assert messages(logger.get_logs(since=at(0))) == ['one', 'two', 'three', 'four']
+        assert messages(logger.get_logs(since=at(5))) == ['two', 'three', 'four']
+        assert messages(logger.get_logs(until=at(11))) == ['one', 'two', 'three']
+        # Entries keep the time they were really written at
+        assert logger.get_logs()[2]['timestamp'] == at(3)
+    finally:
+        logger.close()
+
+    # Rebuilding the index gives the same answers
+    os.remove('chat_logs.idx')
+    logger = ChatLogger()
+    try:
+        assert messages(logger.get_logs(since=at(5))) == ['two', 'three', 'four']
+    finally:
+        logger.close()
@@ -0,0 +1,105 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from llm_client import LLMClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', clock)
+    return clock
+
+
+def make_breaker():
+    return CircuitBreaker(window=10, failure_ratio=0.5, min_calls=4, open_seconds=15, half_open_probes=1)
+
+
+def trip(breaker):
+    for _ in range(4):
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+
+def test_closed_open_half_open_closed(clock):
+    breaker = make_breaker()
+    assert breaker.state == CLOSED
+
+    trip(breaker)
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+    clock.now += 15
+    assert not breaker.is_open()
+    assert breaker.state == HALF_OPEN
+
+    # One probe goes through, the next caller waits for its verdict
+    assert breaker.allow_request()
+    assert breaker.is_open()
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+    assert breaker.get_stats()['rejected'] == 2
+
+
+def test_failed_probe_reopens(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 15
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.get_stats()['times_opened'] == 2
+
+    clock.now += 14
+    assert breaker.is_open()
+
+
+def test_cancelled_probe_frees_its_slot(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 15
+
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    # The probe lost a hedge race - no verdict, another caller may probe
+    breaker.record_cancelled()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_cancelled_call_while_closed_has_no_effect(clock):
+    breaker = make_breaker()
+    breaker.record_cancelled()
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()['window_calls'] == 0
+
+
+def test_is_available_has_no_side_effects(clock):
+    client = LLMClient(api_urls=["http://localhost:1"])
+    client.breaker = make_breaker()
+    trip(client.breaker)
+
+    for _ in range(3):
+        assert not client.is_available()
+    assert client.breaker.get_stats()['rejected'] == 0
+
+    # Peeking in half-open doesn't use up the probe
+    clock.now += 15
+    assert client.is_available()
+    assert client.is_available()
+    assert client.breaker.allow_request()
+    assert not client.is_available()
@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+import duplicate_index
+from config import DUPLICATE_MAX_DISTANCE
+from duplicate_index import DuplicateIndex, SIGNATURE_BITS
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(duplicate_index.time, 'monotonic', clock)
+    return clock
+
+
+def flip_bits(signature, count, rng):
+    for bit in rng.sample(range(SIGNATURE_BITS), count):
+        signature ^= 1 << bit
+    return signature
+
+
+def distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+@pytest.mark.parametrize("size", [10, 2000])
+def test_every_pair_within_max_distance_is_found(size):
+    """Quiet groups are scanned, busy ones probed - both must find every near pair"""
+    rng = random.Random(size)
+    index = DuplicateIndex(window=3600, max_entries=size)
+    stored = [rng.getrandbits(SIGNATURE_BITS) | 1 for _ in range(size)]
+    for signature in stored:
+        index.add_signature(1, signature)
+
+    for signature in rng.sample(stored, min(size, 300)):
+        for flipped in range(DUPLICATE_MAX_DISTANCE + 1):
+            probe = flip_bits(signature, flipped, rng)
+            found = index.find_near(1, probe)
+            assert found is not None, f"missed a pair {flipped} bits apart"
+            assert distance(found, probe) <= DUPLICATE_MAX_DISTANCE
+
+
+def test_lookup_matches_a_linear_scan():
+    rng = random.Random(7)
+    index = DuplicateIndex(window=3600, max_entries=2000)
+    stored = [rng.getrandbits(SIGNATURE_BITS) for _ in range(2000)]
+    for signature in stored:
+        index.add_signature(1, signature)
+
+    for _ in range(500):
+        probe = flip_bits(rng.choice(stored), rng.randint(0, 20), rng)
+        expected = any(distance(probe, other) <= DUPLICATE_MAX_DISTANCE for other in stored)
+        assert (index.find_near(1, probe) is not None) == expected
+
+
+def test_groups_are_kept_apart():
+    index = DuplicateIndex()
+    index.add(1, "haha thats so sweet")
+    assert index.is_duplicate(1, "Haha, thats so sweet!!")
+    assert not index.is_duplicate(2, "haha thats so sweet")
+    assert not index.is_duplicate(1, "how does that work")
+
+
+def test_expired_entries_leave_the_buckets(clock):
+    index = DuplicateIndex(window=60)
+    index.add(1, "haha thats so sweet")
+    index.add(2, "busy rn bro")
+
+    clock.now += 30
+    index.add(1, "how does that work")
+    clock.now += 31
+    assert not index.is_duplicate(1, "haha thats so sweet")
+    assert index.is_duplicate(1, "how does that work")
+    assert list(index.buckets) == [1]
+
+    clock.now += 60
+    assert not index.is_duplicate(1, "how does that work")
+    assert index.buckets == {}
+    assert index.latest == {}
+    assert not index.entries
+
+
+def test_readding_a_message_keeps_it_alive(clock):
+    index = DuplicateIndex(window=60)
+    index.add(1, "haha thats so sweet")
+    clock.now += 40
+    index.add(1, "haha thats so sweet")
+    clock.now += 40
+    # The first entry expired, the newer one still covers the signature
+    assert index.is_duplicate(1, "haha thats so sweet")
+
+
+def test_size_cap_evicts_oldest_from_buckets():
+    index = DuplicateIndex(window=3600, max_entries=3)
+    for signature in (0b1 << 60, 0b11 << 40, 0b111 << 20, 0b1111):
+        index.add_signature(1, signature)
+
+    assert len(index.latest) == 3
+    stored = {sig for band in index.buckets[1] for bucket in band.values() for sig in bucket}
+    assert stored == {0b11 << 40, 0b111 << 20, 0b1111}
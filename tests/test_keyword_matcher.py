@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from keyword_matcher import KeywordMatcher
+from message_handler import SENDER_KEYWORDS, FALLBACK_TOPICS, MessageHandler
+from personality_manager import PersonalityManager
+
+
+def legacy_detect_sender_character(message):
+    """The substring loop detect_sender_character used before the matcher"""
+    msg_lower = message.lower()
+    if any(w in msg_lower for w in ['aww', 'cute', 'sweet', 'maybe later', 'busy']):
+        return "girl"
+    if any(w in msg_lower for w in ['beautiful', 'pretty', 'wanna hang', 'thinking about you']):
+        return "flirty_boy"
+    if any(w in msg_lower for w in ['listen', 'trust me', 'from experience', 'heres the trick']):
+        return "mature_guy"
+    if '?' in message or any(w in msg_lower for w in ['how', 'why', 'what', 'can you explain']):
+        return "curious_teen"
+    if any(w in msg_lower for w in ['money', 'business', 'opportunity', 'earning', 'investment']):
+        return "hustler"
+    return "unknown"
+
+
+def substring_labels(keywords, text):
+    lower = text.lower()
+    return {label for keyword, label in keywords.items() if keyword in lower}
+
+
+@pytest.fixture
+def handler():
+    return MessageHandler(PersonalityManager())
+
+
+def test_overlapping_keywords_are_all_reported():
+    keywords = {'he': 'he', 'she': 'she', 'his': 'his', 'hers': 'hers'}
+    matcher = KeywordMatcher(keywords)
+    assert matcher.labels("ushers") == {'he', 'she', 'hers'}
+    assert matcher.labels("ushers") == substring_labels(keywords, "ushers")
+
+
+def test_keyword_that_is_a_suffix_of_another():
+    keywords = {'trust me': 'long', 'me': 'short', 'st me': 'middle'}
+    matcher = KeywordMatcher(keywords)
+    assert matcher.labels("just trust me") == {'long', 'short', 'middle'}
+    assert matcher.labels("just me") == {'short', 'middle'}
+    assert matcher.labels("trust") == set()
+
+
+def test_matches_across_word_boundaries_like_the_substring_loop():
+    keywords = {'how': 'how', 'listen': 'listen', 'what': 'what', 'busy': 'busy'}
+    matcher = KeywordMatcher(keywords)
+    for text in ["showhow", "whatever bro", "listening now", "bus y", "BUSY!", "how?", "wha t"]:
+        assert matcher.labels(text) == substring_labels(keywords, text), text
+
+
+def test_matching_is_case_insensitive():
+    matcher = KeywordMatcher({'Maybe Later': 'x'})
+    assert matcher.labels("MAYBE later then") == {'x'}
+
+
+def test_detect_sender_character_matches_the_legacy_loop(handler):
+    vocabulary = [word for words in SENDER_KEYWORDS.values() for word in words]
+    vocabulary += [word for words in FALLBACK_TOPICS.values() for word in words]
+    vocabulary += ['hey', 'bro', 'lol', 'ok', 'guys', 'im', 'you', 'the', 'show', 'ever', '!', 'ing']
+    rng = random.Random(22)
+
+    samples = [
+        "aww thats cute", "you look beautiful", "listen bro", "how does that work",
+        "easy money", "hello there", "whatever", "showhow", "", "??", "Trust Me"
+    ]
+    for _ in range(2000):
+        words = rng.choices(vocabulary, k=rng.randint(1, 6))
+        samples.append(rng.choice([' ', '']).join(words))
+
+    for message in samples:
+        assert handler.detect_sender_character(message) == legacy_detect_sender_character(message), message
+
+
+def test_fallback_topics_match_the_legacy_loop(handler):
+    for message in ["money talk", "start a business", "new idea", "an opportunity", "hello", "startup"]:
+        labels = handler.keyword_labels(message)
+        lower = message.lower()
+        assert (('topic', 'hustler_1') in labels) == any(w in lower for w in ['money', 'business', 'idea'])
+        assert (('topic', 'hustler_2') in labels) == any(w in lower for w in ['opportunity', 'business', 'start'])
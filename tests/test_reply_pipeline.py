@@ -0,0 +1,140 @@
+import asyncio
+
+from lanes import HUMAN, BOT
+from reply_pipeline import ReplyPipeline
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    """Let the worker tasks run until they block"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_human_job_overtakes_queued_bot_jobs():
+    async def scenario():
+        order = []
+
+        async def handler(job):
+            order.append(job)
+
+        pipeline = ReplyPipeline(handler, workers=1, max_queue=10)
+        pipeline.start()
+        # Queued before the worker gets to run
+        pipeline.submit("bot-1", BOT)
+        pipeline.submit("bot-2", BOT)
+        pipeline.submit("human-1", HUMAN)
+        await settle()
+        await pipeline.stop()
+        return order
+
+    assert run(scenario()) == ["human-1", "bot-1", "bot-2"]
+
+
+def test_bot_lane_never_exceeds_its_worker_share():
+    async def scenario():
+        gate = asyncio.Event()
+        running = 0
+        peak = 0
+        done = []
+
+        async def handler(job):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await gate.wait()
+            running -= 1
+            done.append(job)
+
+        pipeline = ReplyPipeline(handler, workers=4, max_queue=10, bot_share=0.5)
+        pipeline.start()
+        for i in range(6):
+            pipeline.submit(f"bot-{i}", BOT)
+        await settle()
+
+        busy_while_blocked = pipeline.busy[BOT]
+        # Free workers still pick up human jobs
+        pipeline.submit("human", HUMAN)
+        await settle()
+        human_busy = pipeline.busy[HUMAN]
+
+        gate.set()
+        await settle()
+        await pipeline.stop()
+        return pipeline.lane_limits[BOT], busy_while_blocked, human_busy, peak, done
+
+    limit, busy, human_busy, peak, done = run(scenario())
+    assert limit == 2
+    assert busy == 2
+    assert human_busy == 1
+    assert peak == 3  # two bot jobs plus the human one
+    assert len(done) == 7
+
+
+def test_overflow_sheds_oldest_bot_job_first():
+    async def scenario():
+        gate = asyncio.Event()
+        dropped = []
+
+        async def handler(job):
+            await gate.wait()
+
+        pipeline = ReplyPipeline(handler, workers=1, max_queue=3, on_drop=dropped.append)
+        pipeline.start()
+        # Occupies the only worker
+        pipeline.submit("human-0", HUMAN)
+        await settle()
+
+        pipeline.submit("bot-1", BOT)
+        pipeline.submit("bot-2", BOT)
+        pipeline.submit("human-1", HUMAN)
+        accepted = pipeline.submit("human-2", HUMAN)
+        queued = {lane: [job for _, job in pipeline.lanes[lane]] for lane in (HUMAN, BOT)}
+
+        # Only human jobs left to shed - a bot newcomer is the one turned away
+        pipeline.submit("human-3", HUMAN)
+        bot_accepted = pipeline.submit("bot-3", BOT)
+
+        gate.set()
+        await pipeline.stop()
+        return accepted, queued, bot_accepted, dropped, pipeline.stats['dropped_overflow']
+
+    accepted, queued, bot_accepted, dropped, overflow = run(scenario())
+    assert accepted
+    assert queued == {HUMAN: ["human-1", "human-2"], BOT: ["bot-2"]}
+    assert not bot_accepted
+    assert dropped == ["bot-1", "bot-2", "bot-3"]
+    assert overflow == 3
+
+
+def test_stale_job_is_dropped_without_running():
+    async def scenario():
+        gate = asyncio.Event()
+        handled = []
+        dropped = []
+
+        async def handler(job):
+            handled.append(job)
+            if job == "first":
+                await gate.wait()
+
+        pipeline = ReplyPipeline(handler, workers=1, max_queue=10, max_age=0.05, on_drop=dropped.append)
+        pipeline.start()
+        pipeline.submit("first", HUMAN)
+        await settle()
+        pipeline.submit("stale", HUMAN)
+
+        await asyncio.sleep(0.1)
+        gate.set()
+        await settle()
+        await pipeline.stop()
+        return handled, dropped, pipeline.stats
+
+    handled, dropped, stats = run(scenario())
+    assert handled == ["first"]
+    assert dropped == ["stale"]
+    assert stats['dropped_stale'] == 1
+    assert stats['processed'] == 1
@@ -0,0 +1,131 @@
+import asyncio
+import sqlite3
+
+import pytest
+from telethon import events
+from telethon.errors import FloodWaitError
+
+from account_manager import AccountManager, AccountUnauthorized
+from account_store import AccountStore
+from shard_manager import ShardConnection, ShardCoordinator, ShardWorker, RemoteClient
+
+
+async def connect_pair(path, worker):
+    """Coordinator-side connection to `worker` over a real unix socket"""
+    accepted = asyncio.get_running_loop().create_future()
+
+    async def on_connect(reader, writer):
+        connection = ShardConnection(reader, writer, lambda message: asyncio.sleep(0))
+        connection.start()
+        accepted.set_result(connection)
+
+    server = await asyncio.start_unix_server(on_connect, path=path)
+    reader, writer = await asyncio.open_unix_connection(path)
+    worker.connection = ShardConnection(reader, writer, worker.handle)
+    worker.connection.start()
+    return server, await accepted
+
+
+async def close_pair(server, connection, worker):
+    await worker.connection.close()
+    await connection.close()
+    server.close()
+    await server.wait_closed()
+
+
+def run_with_worker(tmp_path, scenario, **ops):
+    async def main():
+        worker = ShardWorker(0, ['alice'], str(tmp_path / 'shard.sock'))
+        for op, handler in ops.items():
+            setattr(worker, f"op_{op}", handler)
+
+        server, connection = await connect_pair(worker.socket_path, worker)
+        try:
+            coordinator = ShardCoordinator(account_manager=None)
+            await scenario(RemoteClient(coordinator, connection, 'alice'))
+        finally:
+            await close_pair(server, connection, worker)
+
+    asyncio.run(main())
+
+
+def test_flood_wait_round_trips_the_socket(tmp_path):
+    async def send(name, chat_id, text):
+        raise FloodWaitError(request=None, capture=42)
+
+    async def scenario(client):
+        with pytest.raises(FloodWaitError) as raised:
+            await client.send_message(-100, "hi")
+        assert raised.value.seconds == 42
+
+    run_with_worker(tmp_path, scenario, send=send)
+
+
+def test_revoked_session_round_trips_the_socket(tmp_path):
+    async def send(name, chat_id, text):
+        raise AccountUnauthorized("session is no longer authorized")
+
+    async def scenario(client):
+        with pytest.raises(AccountUnauthorized):
+            await client.send_message(-100, "hi")
+
+    run_with_worker(tmp_path, scenario, send=send)
+
+
+def test_send_returns_the_worker_message_id(tmp_path):
+    async def send(name, chat_id, text):
+        assert (name, chat_id, text) == ('alice', -100, "hi")
+        return {'message_id': 7}
+
+    async def scenario(client):
+        message = await client.send_message(-100, "hi")
+        assert (message.id, message.text) == (7, "hi")
+
+    run_with_worker(tmp_path, scenario, send=send)
+
+
+def test_listen_waits_for_the_worker(tmp_path):
+    registered = []
+
+    async def listen(name, chats):
+        await asyncio.sleep(0.01)
+        registered.append((name, chats))
+
+    async def scenario(client):
+        @client.on(events.NewMessage(chats=[-100]))
+        async def handler(event):
+            pass
+
+        await client.coordinator.wait_listening({'client': client})
+        assert registered == [('alice', [-100])]
+        assert client.coordinator.handlers['alice'] == [handler]
+
+    run_with_worker(tmp_path, scenario, listen=listen)
+
+
+def test_listen_failure_reaches_the_coordinator(tmp_path):
+    async def listen(name, chats):
+        raise KeyError(name)
+
+    async def scenario(client):
+        client.on(events.NewMessage(chats=[-100]))(lambda event: None)
+        with pytest.raises(RuntimeError):
+            await client.coordinator.wait_listening({'client': client})
+
+    run_with_worker(tmp_path, scenario, listen=listen)
+
+
+def test_worker_store_is_read_only_and_limited_to_its_shard(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = AccountStore()
+    for name in ('alice', 'bob'):
+        store.add({'name': name, 'api_id': 1, 'api_hash': 'x', 'phone': '', 'username': '', 'first_name': '', 'session_string': ''})
+    store.close()
+    # A legacy file must be left for the main process to migrate
+    (tmp_path / 'accounts.json').write_text('[]')
+
+    manager = AccountManager(['alice'], read_only=True)
+    assert [account['name'] for account in manager.accounts] == ['alice']
+    assert (tmp_path / 'accounts.json').exists()
+    with pytest.raises(sqlite3.OperationalError):
+        manager.store.update('alice', user_id=5)